@@ -0,0 +1,57 @@
+import random
+import string
+import time
+from modules.limpieza import compilar_patron, limpiar_texto
+
+# Micro-benchmark: limpieza de captions con el bucle de str.replace
+# original contra el patron compilado de modules/limpieza.py
+
+def limpiar_caption_bucle(caption, frases):
+    texto_limpio = caption
+    for frase in frases:
+        texto_limpio = texto_limpio.replace(frase, "").strip()
+    while "\n\n\n" in texto_limpio:
+        texto_limpio = texto_limpio.replace("\n\n\n", "\n\n")
+    return texto_limpio.strip()
+
+def generar_frases(cantidad):
+    frases = set()
+    while len(frases) < cantidad:
+        largo = random.randint(6, 30)
+        frases.add("".join(random.choices(string.ascii_letters + " @._", k=largo)))
+    return list(frases)
+
+def generar_captions(frases, cantidad=200):
+    captions = []
+    for _ in range(cantidad):
+        partes = []
+        for _ in range(20):
+            partes.append(" ".join(random.choices(string.ascii_lowercase, k=12)))
+            if random.random() < 0.3:
+                partes.append(random.choice(frases))
+            partes.append("\n\n\n" if random.random() < 0.2 else "\n")
+        captions.append("".join(partes))
+    return captions
+
+def medir(funcion, captions):
+    inicio = time.perf_counter()
+    for caption in captions:
+        funcion(caption)
+    return (time.perf_counter() - inicio) / len(captions) * 1000
+
+if __name__ == '__main__':
+    random.seed(0)
+    for cantidad in (1000, 10000):
+        frases = generar_frases(cantidad)
+        captions = generar_captions(frases)
+
+        inicio = time.perf_counter()
+        patron = compilar_patron(frases)
+        compilacion = (time.perf_counter() - inicio) * 1000
+
+        bucle = medir(lambda c: limpiar_caption_bucle(c, frases), captions)
+        compilado = medir(lambda c: limpiar_texto(c, patron), captions)
+        print(f"{cantidad} frases:")
+        print(f"  bucle str.replace : {bucle:.3f} ms/caption")
+        print(f"  patron compilado  : {compilado:.3f} ms/caption (compilacion {compilacion:.0f} ms)")
+        print(f"  aceleracion       : x{bucle / compilado:.1f}")
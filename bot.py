@@ -1,12 +1,8 @@
 # -*- coding: utf-8 -*-
 import asyncio
 from contextlib import suppress
-import subprocess
 import os, json
-import shutil
 import re
-import threading
-import queue
 import math
 import time
 import uuid
@@ -36,9 +32,26 @@ from spotdl.types.song import Song
 from spotdl.types.options import DownloaderOptions
 from spotdl.utils.config import get_config_file
 
-from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
-from modules.config import OWNER_ID, NAME, API_ID, API_HASH, TARGET_CHANNEL, VERSION, ENGINE, SESSION_STRING
+from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, InputMediaPhoto, InputMediaVideo, InputMediaDocument
+from modules.config import OWNER_ID, NAME, API_ID, API_HASH, TARGET_CHANNEL, VERSION, ENGINE, SESSION_STRING, URLSAVE_EN_VUELO, COPIA_DIRECTA, DEDUP_MODO, MINIATURA_MODO, FORWARD_LOTE, PROGRESO_INTERVALO, COMPRESION_LOTE_CODIFICADORES, COMPRESION_LOTE_EN_VUELO, COMPRESION_LOTE_HISTORIAL
 from modules.gemini import *
+from modules.frases import listado
+from modules.limpieza import limpiar_texto, limpiar_nombre
+from modules.pipeline import pipeline_ordenado
+from modules.prefetch import PrefetchMensajes, agrupar_albumes
+from modules.limitador import limitador
+from modules.trabajos import diario, FALLIDO, CANCELADO
+from modules.indice import indice, clave_mensaje, media_de, OMITIR, REENVIAR, DESACTIVADO
+from modules.sesiones import sesiones
+from modules.subidas import ClienteBot
+from modules.espacio import espacio
+from modules.telemetria import telemetria
+from modules.planificador import planificador, planificado, informar, tarea_actual
+from modules.media import trabajadores, info_video, generar_miniatura
+from modules.compresion import (
+    codificar_por_segmentos, usar_segmentos, decidir_ruta, remuxar,
+    codificar_a_tamano, tamano_pedido, huella_ajustes, cache_compresiones, TRANSCODIFICAR, TAMANO_OBJETIVO, DESCRIPCION_RUTAS
+)
 
 # Diccionario global para almacenar procesos de streaming activos
 active_streams = {}
@@ -54,8 +67,8 @@ last_update_time = 0
 last_current = 0
 update_time = 10
 
-# Crear el cliente del bot
-bot = Client(
+# Crear el cliente del bot (sube los archivos grandes por partes en paralelo)
+bot = ClienteBot(
     f"{NAME}",
     api_id=API_ID,
     api_hash=API_HASH,
@@ -75,7 +88,22 @@ def handle_errors(func):
 
 # Funci¨®n para mostrar progreso de descarga/subida sin tqdm
 async def progress(current, total, status_msg, action):
-    pass  # No mostramos progreso continuo, solo usamos los mensajes iniciales
+    """Registra la transferencia en la telemetria y, como mucho cada
+    PROGRESO_INTERVALO segundos, refleja el avance en status_msg"""
+    clave = (status_msg.chat.id, status_msg.id, action) if status_msg else action
+    transferencia = telemetria.actualizar(clave, action, current, total)
+    informar(f"{action}: {current * 100 / total if total else 0:.0f}%")
+    if status_msg is None or not transferencia.toca_editar():
+        return
+    # La edicion va en segundo plano para no frenar la transferencia
+    transferencia.edicion = asyncio.create_task(editar_progreso(status_msg, action, transferencia))
+
+async def editar_progreso(status_msg, action, transferencia):
+    await editar_estado(status_msg, f"**[”9Ö0]** {action}...\n{transferencia.texto()}")
+
+async def editar_estado(status_msg, texto):
+    with suppress(Exception):
+        await limitador.ejecutar("edit", status_msg.edit, texto)
 
 @handle_errors
 async def download(client: Client, message: Message):
@@ -89,6 +117,9 @@ async def download(client: Client, message: Message):
         )
         return
 
+    _, opciones = separar_opciones(message.command[1:])
+    modo_miniatura = opciones.get("thumb", MINIATURA_MODO)
+
     status_msg = await client.send_message("me", "**[”9Ö0]** Downloading...")
     await client.delete_messages(message.chat.id, message.id)
     
@@ -101,100 +132,144 @@ async def download(client: Client, message: Message):
         )
         return
 
-    media_path = None
-    if msg.media:
-        media_path = await client.download_media(
-            msg,
-            progress=progress,
-            progress_args=(status_msg, "Downloading")
-        )
-        if not media_path:
-            await status_msg.delete()
+    await listado.esperar()
+    text = msg.text or msg.caption
+    caption = limpiar_caption(text) if text else None
+
+    # Si ya se entrego antes se omite o se reenvia por file_id sin transferir nada
+    clave = clave_mensaje(msg, caption)
+    previo = indice.buscar(TARGET_CHANNEL, clave) if DEDUP_MODO != DESACTIVADO else None
+    if previo:
+        await status_msg.delete()
+        if DEDUP_MODO == REENVIAR and previo["file_id"]:
+            await limitador.ejecutar(
+                "send", client.send_cached_media,
+                chat_id=TARGET_CHANNEL,
+                file_id=previo["file_id"],
+                caption=caption
+            )
+        else:
             await client.send_message(
                 chat_id="me",
-                text="**[7·4]** No se pudo descargar el contenido multimedia."
+                text="**[”9Ö0]** Este contenido ya se habia enviado al canal, se omite."
+            )
+        return
+
+    # Si el origen no restringe el guardado se copia en el servidor sin descargar
+    if msg.media and COPIA_DIRECTA and puede_copiarse(msg):
+        try:
+            enviado = await limitador.ejecutar(
+                "send", client.copy_message,
+                chat_id=TARGET_CHANNEL,
+                from_chat_id=msg.chat.id,
+                message_id=msg.id,
+                caption=caption
             )
+            indice.registrar(TARGET_CHANNEL, clave, enviado)
+            await status_msg.delete()
             return
+        except Exception as ex:
+            print(f"No se pudo copiar el mensaje {msg.id}, se descargara: {ex}")
 
-        nombre_original = os.path.basename(media_path)
-        nombre_limpio = limpiar_nombre_archivo(nombre_original)
-        if nombre_original != nombre_limpio:
-            nuevo_path = os.path.join(os.path.dirname(media_path), nombre_limpio)
-            os.rename(media_path, nuevo_path)
-            media_path = nuevo_path
+    # La carpeta es del comando, no del mensaje de origen: dos -dl sobre el
+    # mismo mensaje no deben compartirla ni borrarse la descarga uno a otro
+    carpeta = espacio.abrir(f"dl-{message.chat.id}-{message.id}")
+    try:
+        media_path = None
+        if msg.media:
+            tamano = getattr(media_de(msg), "file_size", 0) or 0
+            async with carpeta.reserva(tamano):
+                media_path = await sesiones.descargar(
+                    msg,
+                    file_name=carpeta.destino(tamano),
+                    progress=progress,
+                    progress_args=(status_msg, "Downloading")
+                )
+            if not media_path:
+                await status_msg.delete()
+                await client.send_message(
+                    chat_id="me",
+                    text="**[7·4]** No se pudo descargar el contenido multimedia."
+                )
+                return
 
-    text = msg.text or msg.caption
-    caption = limpiar_caption(text) if text else None
-    media_type = determine_media_type(media_path) if media_path else None
+            nombre_original = os.path.basename(media_path)
+            nombre_limpio = limpiar_nombre_archivo(nombre_original)
+            if nombre_original != nombre_limpio:
+                nuevo_path = os.path.join(os.path.dirname(media_path), nombre_limpio)
+                os.rename(media_path, nuevo_path)
+                media_path = nuevo_path
 
-    await status_msg.delete()
-    upload_msg = await client.send_message("me", "**[”9Ö0]** Uploading...")
+        media_type = determine_media_type(media_path) if media_path else None
 
-    common_params = {
-        "chat_id": TARGET_CHANNEL,
-        "message_thread_id": None  # No se especifica topic_id por defecto
-    }
+        await status_msg.delete()
+        upload_msg = await client.send_message("me", "**[”9Ö0]** Uploading...")
 
-    try:
-        if media_type == "video":
-            video_info = get_video_info(media_path)
-            thumbnail_path = f"{media_path}_thumb.jpg"
-            (
-                ffmpeg
-                .input(media_path, ss=video_info['duration']//2 if video_info['duration'] > 0 else 0)
-                .filter('scale', 320, -1)
-                .output(thumbnail_path, vframes=1)
-                .overwrite_output()
-                .run(capture_stdout=True, capture_stderr=True)
-            )
-            await client.send_video(
-                **common_params,
-                video=media_path,
-                caption=caption,
-                duration=int(video_info.get('duration', 0)),
-                width=video_info.get('width', 0),
-                height=video_info.get('height', 0),
-                thumb=thumbnail_path if os.path.exists(thumbnail_path) else None,
-                progress=progress,
-                progress_args=(upload_msg, "Uploading")
-            )
-            if os.path.exists(thumbnail_path):
-                os.remove(thumbnail_path)
-        elif media_type == "photo":
-            await client.send_photo(
-                **common_params,
-                photo=media_path,
-                caption=caption,
-                progress=progress,
-                progress_args=(upload_msg, "Uploading")
-            )
-        elif media_type == "document":
-            await client.send_document(
-                **common_params,
-                document=media_path,
-                caption=caption,
-                thumb="thumb.jpg" if os.path.exists("thumb.jpg") else None,
-                progress=progress,
-                progress_args=(upload_msg, "Uploading")
-            )
-        elif text:
-            await client.send_message(
-                **common_params,
-                text=caption,
-                disable_web_page_preview=True
-            )
+        common_params = {
+            "chat_id": TARGET_CHANNEL,
+            "message_thread_id": None  # No se especifica topic_id por defecto
+        }
 
-        await upload_msg.delete()
+        try:
+            enviado = None
+            if media_type == "video":
+                video_info = await info_video(media_path)
+                thumbnail_path = await obtener_miniatura(client, msg, media_path, video_info, modo_miniatura)
+                enviado = await limitador.ejecutar(
+                    "send", client.send_video,
+                    **common_params,
+                    video=media_path,
+                    caption=caption,
+                    duration=int(video_info.get('duration', 0)),
+                    width=video_info.get('width', 0),
+                    height=video_info.get('height', 0),
+                    thumb=thumbnail_path,
+                    progress=progress,
+                    progress_args=(upload_msg, "Uploading")
+                )
+                if thumbnail_path and os.path.exists(thumbnail_path):
+                    os.remove(thumbnail_path)
+            elif media_type == "photo":
+                enviado = await limitador.ejecutar(
+                    "send", client.send_photo,
+                    **common_params,
+                    photo=media_path,
+                    caption=caption,
+                    progress=progress,
+                    progress_args=(upload_msg, "Uploading")
+                )
+            elif media_type == "document":
+                enviado = await limitador.ejecutar(
+                    "send", client.send_document,
+                    **common_params,
+                    document=media_path,
+                    caption=caption,
+                    thumb="thumb.jpg" if os.path.exists("thumb.jpg") else None,
+                    progress=progress,
+                    progress_args=(upload_msg, "Uploading")
+                )
+            elif text:
+                enviado = await limitador.ejecutar(
+                    "send", client.send_message,
+                    **common_params,
+                    text=caption,
+                    disable_web_page_preview=True
+                )
 
-        if media_path and os.path.exists(media_path):
-            os.remove(media_path)
+            indice.registrar(TARGET_CHANNEL, clave, enviado)
+            await upload_msg.delete()
 
-    except Exception as ex:
-        await upload_msg.delete()
-        await client.send_message(
-            chat_id="me",
-            text=f"**[7·4]** Error al enviar el contenido: `{str(ex)}`"
-        )
+            if media_path and os.path.exists(media_path):
+                os.remove(media_path)
+
+        except Exception as ex:
+            await upload_msg.delete()
+            await client.send_message(
+                chat_id="me",
+                text=f"**[7·4]** Error al enviar el contenido: `{str(ex)}`"
+            )
+    finally:
+        await espacio.cerrar(carpeta)
 
 # Funciones auxiliares
 def human_readable_size(size_bytes):
@@ -207,37 +282,14 @@ def human_readable_size(size_bytes):
     s = round(size_bytes / p, 2)
     return f"{s} {size_name[i]}"
 
-def obtener_duracion_video(video_path):
-    """Obtiene la duraci¨®n del video en segundos"""
-    try:
-        probe = ffmpeg.probe(video_path)
-        duration = float(probe['streams'][0]['duration'])
-        return duration
-    except:
-        return 0
-
-def calcular_progreso(output, total_duration):
-    """Calcula el progreso de la compresi¨®n basado en la salida de ffmpeg"""
+def calcular_progreso(datos, total_duration):
+    """Calcula el progreso de la compresi¨®n a partir de un bloque de -progress de ffmpeg"""
     try:
-        time_match = re.search(r'time=(\d{2}:\d{2}:\d{2}.\d{2})', output)
-        size_match = re.search(r'size=\s*(\d+)(\w+)', output)
-        
-        current_time = 0
-        if time_match:
-            time_str = time_match.group(1)
-            h, m, s = map(float, time_str.split(':'))
-            current_time = h * 3600 + m * 60 + s
-        
-        percentage = (current_time / total_duration) * 100 if total_duration > 0 else 0
-        
-        readable_size = "0 MB"
-        if size_match:
-            size = size_match.group(1)
-            unit = size_match.group(2)
-            readable_size = f"{size} {unit}"
-        
+        current_time = int(datos.get('out_time_us') or 0) / 1_000_000
+        percentage = min(100, (current_time / total_duration) * 100) if total_duration > 0 else 0
+        readable_size = human_readable_size(int(datos.get('total_size') or 0))
         return readable_size, percentage, current_time
-    except:
+    except (TypeError, ValueError):
         return "0 MB", 0, 0
 
 # Configuraci¨®n de compresi¨®n por defecto
@@ -250,22 +302,6 @@ DEFAULT_COMPRESSION_SETTINGS = {
     'codec': 'libx264'
 }
 
-def generar_miniatura(video_path, output_path):
-    """Genera una miniatura del video entre los segundos 1 y 9"""
-    try:
-        (
-            ffmpeg
-            .input(video_path, ss='00:00:01')
-            .filter('scale', 320, -1)
-            .output(output_path, vframes=1)
-            .overwrite_output()
-            .run(capture_stdout=True, capture_stderr=True)
-        )
-        return True
-    except Exception as e:
-        print(f"Error generando miniatura: {e}")
-        return False
-
 def determine_media_type(file_path):
     extension = os.path.splitext(file_path)[1].lower()
     if extension in [".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp"]:
@@ -281,75 +317,58 @@ def extract_urls(text):
     url_pattern = r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
     return re.findall(url_pattern, text)
 
-def get_video_info(media_path):
-    try:
-        video_info = ffmpeg.probe(media_path, v='error', select_streams='v:0', 
-                                show_entries='stream=duration,width,height')
-        stream = video_info['streams'][0]
-        
-        return {
-            'duration': float(stream.get('duration', 0)),
-            'width': int(stream.get('width', 0)),
-            'height': int(stream.get('height', 0))
-        }
-    except Exception as e:
+def separar_opciones(argumentos):
+    """Separa los argumentos posicionales de las opciones clave=valor"""
+    posicionales = []
+    opciones = {}
+    for argumento in argumentos:
+        if re.match(r'^[a-zA-Z_]+=', argumento):
+            clave, valor = argumento.split('=', 1)
+            opciones[clave.lower()] = valor
+        else:
+            posicionales.append(argumento)
+    return posicionales, opciones
+
+def opcion_activa(valor, defecto=True):
+    """Interpreta valores como si/no, on/off, 1/0"""
+    if valor is None:
+        return defecto
+    return valor.lower() not in ("no", "off", "0", "false")
+
+def puede_copiarse(msg):
+    """Indica si el mensaje se puede copiar en el servidor sin descargarlo"""
+    if msg.has_protected_content:
+        return False
+    return not (msg.chat and msg.chat.has_protected_content)
+
+async def obtener_miniatura(client, msg, media_path, video_info, modo=MINIATURA_MODO):
+    """Miniatura para subir un video. Con modo 'telegram' se descarga la que ya
+    trae el mensaje (unos KB) y solo si no tiene se extrae un fotograma con
+    ffmpeg; 'ffmpeg' siempre extrae y 'off' no genera ninguna"""
+    if modo == "off":
+        return None
+    thumbnail_path = f"{media_path}_thumb.jpg"
+    thumbs = getattr(media_de(msg), "thumbs", None) if modo == "telegram" else None
+    if thumbs:
+        thumb = max(thumbs, key=lambda t: (t.width or 0) * (t.height or 0))
         try:
-            result = subprocess.run(
-                ['ffprobe', '-v', 'error', 
-                 '-select_streams', 'v:0',
-                 '-show_entries', 'stream=duration,width,height',
-                 '-of', 'json',
-                 media_path],
-                capture_output=True,
-                text=True
-            )
-            info = json.loads(result.stdout)
-            stream = info['streams'][0]
-            
-            return {
-                'duration': float(stream.get('duration', 0)),
-                'width': int(stream.get('width', 0)),
-                'height': int(stream.get('height', 0))
-            }
+            return await client.download_media(thumb.file_id, file_name=thumbnail_path)
         except Exception as ex:
-            print(f"Error getting video info: {ex}")
-            return {
-                'duration': 0,
-                'width': 0,
-                'height': 0
-            }
+            print(f"Error descargando la miniatura de Telegram: {ex}")
+    if await generar_miniatura(media_path, thumbnail_path, video_info['duration'] // 2):
+        return thumbnail_path
+    return None
 
 def get_listado():
-    url = "https://datafacil.vercel.app/listado.json"
-    response = requests.get(url)
-    frases = response.json()
-    return frases
+    return listado.obtener()
 
 def limpiar_caption(caption):
     if not caption:
         return caption
-        
-    texto_limpio = caption
-    for frase in get_listado():
-        texto_limpio = texto_limpio.replace(frase, "").strip()
-    
-    while "\n\n\n" in texto_limpio:
-        texto_limpio = texto_limpio.replace("\n\n\n", "\n\n")
-    
-    return texto_limpio.strip()
+    return limpiar_texto(caption, listado.patron())
 
 def limpiar_nombre_archivo(nombre):
-    nombre_limpio = nombre
-    for frase in get_listado():
-        nombre_limpio = nombre_limpio.replace(frase, "").strip()
-    
-    while "  " in nombre_limpio:
-        nombre_limpio = nombre_limpio.replace("  ", " ")
-    
-    nombre_sin_ext, ext = os.path.splitext(nombre_limpio)
-    nombre_limpio = f"{nombre_sin_ext}{ext}"
-    
-    return nombre_limpio.strip()
+    return limpiar_nombre(nombre, listado.patron())
 
 # Handlers
 @handle_errors
@@ -380,116 +399,465 @@ async def set_compression_settings(client: Client, message: Message):
     except Exception as e:
         await message.reply(f"**[7·4] Error:** `{str(e)}`")
 
+def video_de(msg):
+    """Video o documento de video de un mensaje (None si no tiene)"""
+    if msg.video:
+        return msg.video
+    if msg.document and determine_media_type(msg.document.file_name or "") == "video":
+        return msg.document
+    return None
+
+def parsear_enlace(link):
+    """(chat_id, message_id, topic_id) de un enlace t.me, o None si no es valido"""
+    private_with_topic = r"https?://t\.me/c/(\d+)/(\d+)/(\d+)"
+    private_pattern = r"https?://t\.me/c/(\d+)/(\d+)"
+    public_pattern = r"https?://t\.me/([\w\d_]+)/(\d+)"
+    bot_pattern = r"https?://t\.me/b/([\w\d_]+)/(\d+)"
+
+    if re.match(private_with_topic, link):
+        match = re.match(private_with_topic, link)
+        return int("-100" + match.group(1)), int(match.group(3)), int(match.group(2))
+    if re.match(private_pattern, link):
+        match = re.match(private_pattern, link)
+        return int("-100" + match.group(1)), int(match.group(2)), None
+    if re.match(public_pattern, link):
+        match = re.match(public_pattern, link)
+        return match.group(1), int(match.group(2)), None
+    if re.match(bot_pattern, link):
+        match = re.match(bot_pattern, link)
+        return match.group(1), int(match.group(2)), None
+    return None
+
+async def codificar_compresion(original_path, compressed_path, original_info, opciones, tamano_objetivo, al_progresar=None, paralelo=None):
+    """Codifica por la ruta que toque (tamano objetivo, remux, segmentos o un
+    proceso) y devuelve el texto que describe la ruta usada. `paralelo` es el
+    valor por defecto del modo por segmentos si el comando no trae paralelo="""
+    al_progresar = al_progresar or (lambda datos: None)
+    original_duration = original_info.get('duration', 0)
+    pedido = opciones.get('paralelo')
+    if pedido is not None:
+        paralelo = opcion_activa(pedido)
+    ruta = TAMANO_OBJETIVO if tamano_objetivo else decidir_ruta(original_info, DEFAULT_COMPRESSION_SETTINGS)
+    segmentos = None
+    inicio_codificacion = time.monotonic()
+    if ruta == TAMANO_OBJETIVO:
+        bitrate = await codificar_a_tamano(
+            original_path, compressed_path, DEFAULT_COMPRESSION_SETTINGS,
+            original_duration, tamano_objetivo, al_progresar
+        )
+    elif ruta != TRANSCODIFICAR:
+        await remuxar(original_path, compressed_path, DEFAULT_COMPRESSION_SETTINGS, ruta, al_progresar)
+    elif usar_segmentos(original_duration, paralelo):
+        segmentos = await codificar_por_segmentos(
+            original_path, compressed_path, DEFAULT_COMPRESSION_SETTINGS, original_duration, al_progresar
+        )
+    if ruta == TRANSCODIFICAR and not segmentos:
+        await trabajadores.ffmpeg_progreso(
+            ffmpeg
+            .input(original_path)
+            .output(
+                compressed_path,
+                vf=f'scale={DEFAULT_COMPRESSION_SETTINGS["resolution"]},fps={DEFAULT_COMPRESSION_SETTINGS["fps"]}',
+                crf=DEFAULT_COMPRESSION_SETTINGS['crf'],
+                preset=DEFAULT_COMPRESSION_SETTINGS['preset'],
+                vcodec=DEFAULT_COMPRESSION_SETTINGS['codec'],
+                acodec='aac',
+                audio_bitrate=DEFAULT_COMPRESSION_SETTINGS['audio_bitrate'],
+                movflags='+faststart'
+            )
+            .global_args('-loglevel', 'error')
+            .global_args('-y'),
+            al_progresar
+        )
+    segundos_codificacion = time.monotonic() - inicio_codificacion
+    huella = huella_ajustes(DEFAULT_COMPRESSION_SETTINGS)
+    if ruta == TAMANO_OBJETIVO:
+        return (
+            f"{DESCRIPCION_RUTAS[ruta]} ({human_readable_size(tamano_objetivo)}, "
+            f"video a {bitrate // 1000} kbps)"
+        )
+    if ruta != TRANSCODIFICAR:
+        return DESCRIPCION_RUTAS[ruta]
+    if segmentos:
+        mejora = cache_compresiones.aceleracion(huella, original_duration, segundos_codificacion)
+        return f"{DESCRIPCION_RUTAS[ruta]}, {segmentos} segmentos en paralelo" + (
+            f" (x{mejora:.1f} estimado frente a la ultima compresion en un proceso con estos ajustes)"
+            if mejora else ""
+        )
+    cache_compresiones.registrar_velocidad(huella, original_duration, segundos_codificacion)
+    return f"{DESCRIPCION_RUTAS[ruta]}, un proceso"
+
+def texto_compresion(base_name, original_size, compressed_size, duration_str, modo_texto, tiempo_procesamiento):
+    """Caption con las estadisticas de una compresion"""
+    return (
+        f"**[7¼3] {base_name} - Compresi¨®n completada**\n\n"
+        f"**”9Ý6 Estad¨ªsticas:**\n"
+        f"©Ä Tama0Š9o original: {human_readable_size(original_size)}\n"
+        f"©Ä Tama0Š9o comprimido: {human_readable_size(compressed_size)}\n"
+        f"©Ä Reducci¨®n: {((original_size - compressed_size) / original_size * 100):.1f}%\n"
+        f"©º Duraci¨®n del video: {duration_str}\n\n"
+        f"**7±5„1‚5 Configuraci¨®n usada:**\n"
+        f"©Ä Resoluci¨®n: {DEFAULT_COMPRESSION_SETTINGS['resolution']}\n"
+        f"©Ä CRF: {DEFAULT_COMPRESSION_SETTINGS['crf']}\n"
+        f"©Ä FPS: {DEFAULT_COMPRESSION_SETTINGS['fps']}\n"
+        f"©Ä Codec: {DEFAULT_COMPRESSION_SETTINGS['codec']}\n"
+        f"©Ä Preset: {DEFAULT_COMPRESSION_SETTINGS['preset']}\n"
+        f"©Ä Audio: {DEFAULT_COMPRESSION_SETTINGS['audio_bitrate']}\n"
+        f"©º Ruta: {modo_texto}\n\n"
+        f"**75„1‚5 Tiempo de compresi¨®n:** {str(tiempo_procesamiento).split('.')[0]}"
+    )
+
+async def ultimos_videos(client, chat_id, cantidad):
+    """Los ultimos `cantidad` mensajes con video de un chat, del mas antiguo al mas nuevo"""
+    encontrados = []
+    async for msg in client.get_chat_history(chat_id, limit=COMPRESION_LOTE_HISTORIAL):
+        if video_de(msg):
+            encontrados.append(msg)
+            if len(encontrados) >= cantidad:
+                break
+    return list(reversed(encontrados))
+
+async def mensajes_lote(client, message, args, opciones):
+    """Mensajes de un lote de -compress: `last=N [chat]`, un enlace con cantidad
+    o el album respondido. Devuelve (mensajes, total) o None si no es un lote"""
+    if 'last' in opciones:
+        chat_id = int(args[0]) if args and args[0].lstrip('-').isdigit() else message.chat.id
+        mensajes = await ultimos_videos(client, chat_id, int(opciones['last']))
+        return mensajes, len(mensajes)
+    if args and parsear_enlace(args[0]):
+        chat_id, message_id, _ = parsear_enlace(args[0])
+        cantidad = int(args[1]) if len(args) > 1 else 1
+        return PrefetchMensajes(client, chat_id, message_id, cantidad), cantidad
+    respondido = message.reply_to_message
+    if respondido and respondido.media_group_id and opcion_activa(opciones.get('album')):
+        mensajes = await limitador.ejecutar("get", client.get_media_group, respondido.chat.id, respondido.id)
+        return mensajes, len(mensajes)
+    return None
+
+async def comprimir_lote(client, message, mensajes, total, opciones, tamano_objetivo):
+    """Comprime varios videos: las descargas y codificaciones van por delante
+    (hasta COMPRESION_LOTE_EN_VUELO, con COMPRESION_LOTE_CODIFICADORES
+    codificando a la vez) y las subidas salen en el orden original"""
+    status_msg = await message.reply(f"**[”9Ö0]** Comprimiendo lote de {total} mensajes...")
+    carpeta = espacio.abrir(f"compress-{message.chat.id}-{message.id}")
+    codificadores = asyncio.Semaphore(COMPRESION_LOTE_CODIFICADORES)
+    huella = huella_ajustes(DEFAULT_COMPRESSION_SETTINGS, tamano_objetivo)
+    usar_cache = opcion_activa(opciones.get('cache'))
+    actual = tarea_actual.get()
+    cancelar = f"\n`-cancel {actual.id}` para cancelar" if actual else ""
+    cuentas = {"comprimidos": 0, "cache": 0, "omitidos": 0, "errores": 0}
+    bytes_original = 0
+    bytes_comprimido = 0
+    procesados = 0
+    ultimo_aviso = 0
+    start_time = datetime.datetime.now()
+
+    async def preparar(msg):
+        media = video_de(msg)
+        if media is None:
+            return None
+        if tamano_objetivo and media.file_size and media.file_size <= tamano_objetivo:
+            return None
+        origen = getattr(media, 'file_unique_id', None)
+        previo = cache_compresiones.buscar(origen, huella) if usar_cache else None
+        if previo:
+            return {"previo": previo, "origen": origen, "original_size": media.file_size or 0}
+
+        original_filename = media.file_name or f"video_{msg.id}.mp4"
+        base_name = os.path.splitext(original_filename)[0]
+        item = {
+            "origen": origen,
+            "base_name": base_name,
+            "media_path": os.path.join(carpeta.ruta, f"{msg.id}_{base_name}_compressed.mp4"),
+            "thumbnail_path": None
+        }
+        original_path = None
+        try:
+            async with carpeta.reserva(media.file_size):
+                original_path = await sesiones.descargar(
+                    msg, file_name=os.path.join(carpeta.ruta, f"{msg.id}_{original_filename}")
+                )
+            original_info = await info_video(original_path)
+            item["original_size"] = os.path.getsize(original_path)
+            item["thumbnail_path"] = await obtener_miniatura(client, msg, original_path, original_info)
+            async with codificadores:
+                inicio = datetime.datetime.now()
+                modo_texto = await codificar_compresion(
+                    original_path, item["media_path"], original_info, opciones, tamano_objetivo, paralelo=False
+                )
+            item["compressed_size"] = os.path.getsize(item["media_path"])
+            item["info"] = await info_video(item["media_path"])
+            item["texto"] = texto_compresion(
+                base_name, item["original_size"], item["compressed_size"],
+                str(datetime.timedelta(seconds=int(original_info.get('duration', 0)))),
+                modo_texto, datetime.datetime.now() - inicio
+            )
+            return item
+        except BaseException:
+            limpiar_item(item)
+            raise
+        finally:
+            if original_path and os.path.exists(original_path):
+                os.remove(original_path)
+
+    async def consumir(msg, tarea):
+        nonlocal procesados, ultimo_aviso, bytes_original, bytes_comprimido
+        item = None
+        try:
+            item = await tarea
+            if item is None:
+                cuentas["omitidos"] += 1
+                return
+            respuesta = msg.id if msg.chat.id == message.chat.id else None
+            if "previo" in item:
+                try:
+                    await limitador.ejecutar(
+                        "send", client.send_video,
+                        chat_id=message.chat.id,
+                        video=item["previo"]["file_id"],
+                        caption=f"{item['previo']['texto']}\n\n**[”9Ö0]** Reutilizado de una compresi¨®n anterior.",
+                        reply_to_message_id=respuesta
+                    )
+                except Exception:
+                    cache_compresiones.olvidar(item["origen"], huella)
+                    raise
+                cuentas["cache"] += 1
+                bytes_original += item["original_size"]
+                bytes_comprimido += item["previo"]["tamano"] or 0
+                return
+            enviado = await limitador.ejecutar(
+                "send", client.send_video,
+                chat_id=message.chat.id,
+                video=item["media_path"],
+                caption=item["texto"],
+                duration=int(item["info"].get('duration', 0)),
+                width=item["info"].get('width', 0),
+                height=item["info"].get('height', 0),
+                thumb=item["thumbnail_path"],
+                file_name=f"{item['base_name']}_compressed.mp4",
+                reply_to_message_id=respuesta
+            )
+            cache_compresiones.guardar(
+                item["origen"], huella, getattr(media_de(enviado), 'file_id', None), item["texto"], item["compressed_size"]
+            )
+            cuentas["comprimidos"] += 1
+            bytes_original += item["original_size"]
+            bytes_comprimido += item["compressed_size"]
+        except Exception as ex:
+            cuentas["errores"] += 1
+            print(f"Error comprimiendo el mensaje {msg.id} del lote: {ex}")
+        finally:
+            if item and "previo" not in item:
+                limpiar_item(item)
+            procesados += 1
+            informar(f"Lote: {procesados}/{total}")
+            if time.monotonic() - ultimo_aviso >= PROGRESO_INTERVALO:
+                ultimo_aviso = time.monotonic()
+                with suppress(Exception):
+                    await limitador.ejecutar(
+                        "edit", status_msg.edit,
+                        f"**[”9Ö0]** Comprimiendo lote: {procesados}/{total} mensajes procesados...{cancelar}"
+                    )
+
+    try:
+        await pipeline_ordenado(
+            mensajes, preparar, consumir,
+            en_vuelo=COMPRESION_LOTE_EN_VUELO,
+            descartar=limpiar_item
+        )
+    except asyncio.CancelledError:
+        with suppress(Exception):
+            await status_msg.edit(f"**[7·4]** Lote cancelado tras {procesados}/{total} mensajes.")
+        raise
+    finally:
+        await espacio.cerrar(carpeta)
+
+    ahorro = bytes_original - bytes_comprimido
+    tiempo_procesamiento = datetime.datetime.now() - start_time
+    await status_msg.edit(
+        f"**[7¼3] Lote de compresi¨®n completado**\n\n"
+        f"©Ä Comprimidos: {cuentas['comprimidos']}\n"
+        f"©Ä Desde la cache: {cuentas['cache']}\n"
+        f"©Ä Omitidos (sin video o ya dentro del tama0Š9o): {cuentas['omitidos']}\n"
+        f"©Ä Errores: {cuentas['errores']}\n"
+        f"©Ä Tama0Š9o original: {human_readable_size(bytes_original)}\n"
+        f"©Ä Tama0Š9o comprimido: {human_readable_size(bytes_comprimido)}\n"
+        f"©Ä Ahorro: {human_readable_size(max(ahorro, 0))}"
+        + (f" ({ahorro / bytes_original * 100:.1f}%)" if bytes_original else "") + "\n"
+        f"©º Tiempo total: {str(tiempo_procesamiento).split('.')[0]}"
+    )
+
+@planificado("encode")
 @handle_errors
 async def compress_video(client: Client, message: Message):
     if message.from_user.id not in OWNER_ID:
         return
     
+    args, opciones = separar_opciones(message.command[1:])
+    tamano_objetivo = None
+    if 'size' in opciones:
+        tamano_objetivo = tamano_pedido(opciones['size'])
+        if not tamano_objetivo:
+            await message.reply("**[7·4]** Tama0Š9o no v¨¢lido. Ejemplo: `-compress size=50MB`")
+            return
+
+    try:
+        lote = await mensajes_lote(client, message, args, opciones)
+    except ValueError:
+        await message.reply("**[7·4]** Uso: `-compress last=N [chat_id]` o `-compress [enlace] [cantidad]`")
+        return
+    if lote:
+        await comprimir_lote(client, message, *lote, opciones, tamano_objetivo)
+        return
+
     if not message.reply_to_message or (not message.reply_to_message.video and not message.reply_to_message.document):
         await message.reply("**[7·4]** Debes responder a un video o un archivo de video.")
         return
     
-    is_document = message.reply_to_message.document is not None
-    if is_document:
-        media = message.reply_to_message.document
-        file_name = media.file_name or f"video_{message.id}"
-        if not determine_media_type(file_name) == "video":
-            await message.reply("**[7·4]** El archivo no es un video v¨¢lido.")
+    media = video_de(message.reply_to_message)
+    if media is None:
+        await message.reply("**[7·4]** El archivo no es un video v¨¢lido.")
+        return
+
+    # Si el original ya cabe no hace falta ni descargarlo
+    if tamano_objetivo and media.file_size and media.file_size <= tamano_objetivo:
+        await message.reply(
+            f"**[”9Ö0]** El video ya ocupa {human_readable_size(media.file_size)}, "
+            f"por debajo de {human_readable_size(tamano_objetivo)}. No hace falta comprimirlo."
+        )
+        return
+
+    # Mismo original y mismos ajustes: se reenvia el resultado anterior
+    origen = getattr(media, 'file_unique_id', None)
+    huella = huella_ajustes(DEFAULT_COMPRESSION_SETTINGS, tamano_objetivo)
+    previo = cache_compresiones.buscar(origen, huella) if opcion_activa(opciones.get('cache')) else None
+    if previo:
+        try:
+            await limitador.ejecutar(
+                "send", client.send_video,
+                chat_id=message.chat.id,
+                video=previo["file_id"],
+                caption=f"{previo['texto']}\n\n**[”9Ö0]** Reutilizado de una compresi¨®n anterior (`cache=no` para repetirla).",
+                reply_to_message_id=message.reply_to_message.id
+            )
             return
-    else:
-        media = message.reply_to_message.video
+        except Exception as ex:
+            print(f"Compresi¨®n en cache no reutilizable ({ex}), se vuelve a comprimir")
+            cache_compresiones.olvidar(origen, huella)
 
     original_path = None
     compressed_path = None
     thumbnail_path = None
     start_time = datetime.datetime.now()
+    carpeta = espacio.abrir(f"compress-{message.chat.id}-{message.id}")
     
     try:
         status_msg = await message.reply("**[”9Ö0]** Descargando video...")
         original_filename = media.file_name or f"video_{message.id}.mp4"
-        original_path = await client.download_media(
-            media,
-            file_name=f"downloads/{original_filename}"
-        )
+        async with carpeta.reserva(media.file_size):
+            original_path = await sesiones.descargar(
+                message.reply_to_message,
+                file_name=os.path.join(carpeta.ruta, original_filename)
+            )
         
         if not os.path.exists(original_path):
             await status_msg.edit("**[7·4]** Error al descargar el video.")
             return
         
-        original_info = get_video_info(original_path)
+        original_info = await info_video(original_path)
         original_size = os.path.getsize(original_path)
         original_duration = original_info.get('duration', 0)
         
+        if tamano_objetivo and not original_duration:
+            await status_msg.edit(
+                "**[7·4]** No se pudo leer la duraci¨®n del video, as¨ª que no se puede calcular "
+                "el bitrate para `size=`. Prueba sin `size=`."
+            )
+            return
+        
         duration_str = str(datetime.timedelta(seconds=int(original_duration)))
         await status_msg.edit(f"**[”9Ö0]** Video descargado ({duration_str}). Comprimiendo...")
         
         base_name = os.path.splitext(original_filename)[0]
-        compressed_path = f"downloads/{base_name}_compressed.mp4"
-        thumbnail_path = f"downloads/{base_name}_thumb.jpg"
-        
-        generar_miniatura(original_path, thumbnail_path)
+        compressed_path = os.path.join(carpeta.ruta, f"{base_name}_compressed.mp4")
+        thumbnail_path = await obtener_miniatura(client, message.reply_to_message, original_path, original_info)
         
-        (
-            ffmpeg
-            .input(original_path)
-            .output(
-                compressed_path,
-                vf=f'scale={DEFAULT_COMPRESSION_SETTINGS["resolution"]},fps={DEFAULT_COMPRESSION_SETTINGS["fps"]}',
-                crf=DEFAULT_COMPRESSION_SETTINGS['crf'],
-                preset=DEFAULT_COMPRESSION_SETTINGS['preset'],
-                vcodec=DEFAULT_COMPRESSION_SETTINGS['codec'],
-                acodec='aac',
-                audio_bitrate=DEFAULT_COMPRESSION_SETTINGS['audio_bitrate'],
-                movflags='+faststart'
+        tarea = tarea_actual.get()
+        cancelar = f"\n`-cancel {tarea.id}` para cancelar" if tarea else ""
+        ultimo_aviso = 0
+        edicion = None
+
+        def al_progresar(datos):
+            nonlocal ultimo_aviso, edicion
+            readable_size, percentage, current_time = calcular_progreso(datos, original_duration)
+            informar(f"Comprimiendo: {percentage:.0f}%")
+            if time.monotonic() - ultimo_aviso < PROGRESO_INTERVALO and datos.get('progress') != 'end':
+                return
+            if edicion and not edicion.done():
+                return
+            ultimo_aviso = time.monotonic()
+            velocidad = datos.get('speed', '').rstrip('x').strip()
+            try:
+                eta = (original_duration - current_time) / float(velocidad)
+                eta_str = str(datetime.timedelta(seconds=int(max(0, eta))))
+            except (ValueError, ZeroDivisionError):
+                velocidad, eta_str = "?", "?"
+            # La edicion va en segundo plano: si espera por un FloodWait nadie
+            # dejaria de leer la salida de ffmpeg y la codificacion se pararia
+            edicion = asyncio.create_task(editar_estado(
+                status_msg,
+                f"**[”9Ö0]** Comprimiendo ({duration_str})...\n"
+                f"©Ä Progreso: {percentage:.1f}%\n"
+                f"©Ä Tama0Š9o actual: {readable_size}\n"
+                f"©Ä Velocidad: {velocidad}x\n"
+                f"©º ETA: {eta_str}{cancelar}"
+            ))
+
+        try:
+            modo_texto = await codificar_compresion(
+                original_path, compressed_path, original_info, opciones, tamano_objetivo, al_progresar
             )
-            .global_args('-loglevel', 'error')
-            .global_args('-y')
-            .run()
-        )
+        finally:
+            if edicion and not edicion.done():
+                edicion.cancel()
         
         if not os.path.exists(compressed_path):
             await status_msg.edit("**[7·4]** Error al comprimir el video.")
             return
         
         compressed_size = os.path.getsize(compressed_path)
-        compressed_info = get_video_info(compressed_path)
+        compressed_info = await info_video(compressed_path)
         tiempo_procesamiento = datetime.datetime.now() - start_time
         
-        result_text = (
-            f"**[7¼3] {base_name} - Compresi¨®n completada**\n\n"
-            f"**”9Ý6 Estad¨ªsticas:**\n"
-            f"©Ä Tama0Š9o original: {human_readable_size(original_size)}\n"
-            f"©Ä Tama0Š9o comprimido: {human_readable_size(compressed_size)}\n"
-            f"©Ä Reducci¨®n: {((original_size - compressed_size) / original_size * 100):.1f}%\n"
-            f"©º Duraci¨®n del video: {duration_str}\n\n"
-            f"**7±5„1‚5 Configuraci¨®n usada:**\n"
-            f"©Ä Resoluci¨®n: {DEFAULT_COMPRESSION_SETTINGS['resolution']}\n"
-            f"©Ä CRF: {DEFAULT_COMPRESSION_SETTINGS['crf']}\n"
-            f"©Ä FPS: {DEFAULT_COMPRESSION_SETTINGS['fps']}\n"
-            f"©Ä Codec: {DEFAULT_COMPRESSION_SETTINGS['codec']}\n"
-            f"©Ä Preset: {DEFAULT_COMPRESSION_SETTINGS['preset']}\n"
-            f"©º Audio: {DEFAULT_COMPRESSION_SETTINGS['audio_bitrate']}\n\n"
-            f"**75„1‚5 Tiempo de compresi¨®n:** {str(tiempo_procesamiento).split('.')[0]}"
+        result_text = texto_compresion(
+            base_name, original_size, compressed_size, duration_str, modo_texto, tiempo_procesamiento
         )
         
         await status_msg.edit("**[”9Ö0]** Subiendo video comprimido...")
         
-        thumb = thumbnail_path if os.path.exists(thumbnail_path) else None
-        
-        await client.send_video(
+        enviado = await limitador.ejecutar(
+            "send", client.send_video,
             chat_id=message.chat.id,
             video=compressed_path,
             caption=result_text,
             duration=int(compressed_info.get('duration', original_duration)),
             width=compressed_info.get('width', 0),
             height=compressed_info.get('height', 0),
-            thumb=thumb,
+            thumb=thumbnail_path,
             file_name=f"{base_name}_compressed.mp4",
             reply_to_message_id=message.reply_to_message.id
         )
+        cache_compresiones.guardar(
+            origen, huella, getattr(media_de(enviado), 'file_id', None), result_text, compressed_size
+        )
         
         await status_msg.delete()
     
+    except asyncio.CancelledError:
+        with suppress(Exception):
+            await status_msg.edit("**[7·4]** Compresi¨®n cancelada.")
+        raise
+
     except Exception as e:
         error_msg = f"**[7·4]** Error al comprimir el video: `{str(e)}`"
         try:
@@ -498,9 +866,7 @@ async def compress_video(client: Client, message: Message):
             await message.reply(error_msg)
     
     finally:
-        for file_path in [original_path, compressed_path, thumbnail_path]:
-            if file_path and os.path.exists(file_path):
-                os.remove(file_path)
+        await espacio.cerrar(carpeta)
 
 @handle_errors
 async def start(client: Client, message: Message):
@@ -555,12 +921,27 @@ async def help(client: Client, message: Message):
 <code>-stopstream</code> <i>stream_id</i>
 ©¸ Detiene un stream en progreso
 
-<code>-urlsave</code> <i>enlace</i> <i>cantidad</i> <i>channel_id</i> <i>topic_id</i>
+<code>-urlsave</code> <i>enlace</i> <i>cantidad</i> <i>channel_id</i> <i>topic_id</i> <i>copy=no</i> <i>dup=skip|resend|off</i> <i>thumb=telegram|ffmpeg|off</i>
 ©¸ Guarda mensajes de un enlace de Telegram
 
-<code>-save</code> <i>id chanel</i> <i>cantidad</i> <i>channel_id</i> <i>topic_id</i>
+<code>-save</code> <i>id chanel</i> <i>cantidad</i> <i>channel_id</i> <i>topic_id</i> <i>dup=skip|off</i>
 ©¸ Renvio masivo de mensajes de un canal a otro
 
+<code>-jobs</code>
+©¸ Lista los trabajos de -save/-urlsave y su progreso
+
+<code>-queue</code>
+©¸ Tareas pesadas en ejecucion y en cola
+
+<code>-cancel</code> <i>id_tarea</i>
+©¸ Cancela una tarea en cola o en ejecucion
+
+<code>-transfers</code>
+©¸ Velocidad de las transferencias activas y recientes
+
+<code>-resume</code> <i>id_trabajo</i>
+©¸ Reanuda un trabajo interrumpido
+
 <code>-clear</code>
 ©¸ Limpia la carpeta de descargas
 
@@ -570,13 +951,16 @@ async def help(client: Client, message: Message):
 <code>-afk</code>
 ©¸ Activa/desactiva el modo AFK
 
-<code>-compress</code> <i>reply to video/document</i>
-©¸ Comprime un video o archivo de video
+<code>-compress</code> <i>reply to video/document</i> <i>paralelo=si|no</i> <i>size=50MB</i> <i>cache=no</i>
+©¸ Comprime un video o archivo de video (por segmentos en paralelo si es largo; si ya cumple la configuraci¨®n solo se remuxa; con size= se ajusta el bitrate para no pasar de ese tama0Š9o; si ya se comprimi¨® con los mismos ajustes se reenv¨ªa al momento)
+
+<code>-compress</code> <i>last=N [chat_id]</i> | <i>[enlace] [cantidad]</i> | <i>reply to album</i>
+©¸ Comprime en lote los ¨²ltimos N videos, un rango de mensajes o un ¨¢lbum (album=no para solo el video respondido) y resume el espacio ahorrado
 
 <code>-setcompression</code> <i>param=valor</i>
 ©¸ Configura los par¨¢metros de compresi¨®n
 
-<code>.dl</code> <i>reply to media</i>
+<code>.dl</code> <i>reply to media</i> <i>thumb=telegram|ffmpeg|off</i>
 ©¸ Descarga y env¨ªa un documento, video, audio o foto a mensajes guardados
 """
         await message.reply(
@@ -635,14 +1019,14 @@ async def userinfo(client: Client, message: Message):
         pic = ui.photo.big_file_id if ui.photo else None
         if pic is not None:
             await msg.delete()
-            photo = await client.download_media(pic)
-            await message.reply_photo(
-                photo=photo,
-                caption="".join(ui_text),
-                reply_markup=keyboard,
-            )
-            if os.path.exists(photo):
-                os.remove(photo)
+            async with espacio.carpeta(f"userinfo-{message.id}") as carpeta:
+                async with carpeta.reserva(0):
+                    photo = await client.download_media(pic, file_name=carpeta.destino())
+                await message.reply_photo(
+                    photo=photo,
+                    caption="".join(ui_text),
+                    reply_markup=keyboard,
+                )
         else:
             await bot.send_message(message.chat.id, text="".join(ui_text))
 
@@ -676,14 +1060,15 @@ async def get_chat_info(client: Client, message: Message):
         ]
         pic = chat_info.photo.big_file_id if chat_info.photo else None
         if pic is not None:
-            photo = await bot.download_media(pic)
-            await bot.send_photo(
-                message.chat.id,
-                photo,
-                caption="".join(chat_info_text),
-                reply_to_message_id=message.id,
-            )
-            os.remove(photo)
+            async with espacio.carpeta(f"chatinfo-{message.id}") as carpeta:
+                async with carpeta.reserva(0):
+                    photo = await bot.download_media(pic, file_name=carpeta.destino())
+                await bot.send_photo(
+                    message.chat.id,
+                    photo,
+                    caption="".join(chat_info_text),
+                    reply_to_message_id=message.id,
+                )
             await msg.delete()
             return
         else:
@@ -698,18 +1083,22 @@ async def upload_to_story(client: Client, message: Message):
         await message.reply("**[7·4]** Debes responder a un video o una imagen.")
         return
     
+    carpeta = espacio.abrir(f"story-{message.id}")
     try:
         status_msg = await message.reply("**[”9Ö0]** Descargando archivo...")
         media = message.reply_to_message.video if message.reply_to_message.video else message.reply_to_message.photo
-        media_path = await client.download_media(
-            media,
-        )
+        tamano = getattr(media, "file_size", 0) or 0
+        async with carpeta.reserva(tamano):
+            media_path = await client.download_media(
+                media,
+                file_name=carpeta.destino(tamano)
+            )
         
         caption = message.text.split(" ", 1)[1] if len(message.text.split(" ", 1)) > 1 else None
         
         duration = None
         if message.reply_to_message.video:
-            video_info = get_video_info(media_path)
+            video_info = await info_video(media_path)
             duration = int(video_info['duration'])
         
         if message.reply_to_message.video:
@@ -726,36 +1115,413 @@ async def upload_to_story(client: Client, message: Message):
                 caption=caption
             )
         
-        if os.path.exists(media_path):
-            os.remove(media_path)
-        
         await status_msg.edit("**[7¼3]** Archivo subido a tu historia exitosamente.")
     
     except Exception as ex:
         await message.reply(f"**[7·4]** Error al subir a la historia: {ex}")
+    
+    finally:
+        await espacio.cerrar(carpeta)
 
+class TransferenciaAbortada(Exception):
+    pass
+
+async def preparar_mensaje(client, msg, copiar=False, destino=None, dedup=DESACTIVADO, miniatura=MINIATURA_MODO, carpeta=None):
+    """Descarga un mensaje dejando listo todo lo necesario para reenviarlo"""
+    text = msg.text or msg.caption
+    item = {
+        "msg": msg,
+        "omitir": not msg.media and not text,
+        "copiar": bool(copiar and msg.media and puede_copiarse(msg)),
+        "media_path": None,
+        "thumbnail_path": None,
+        "video_info": None,
+        "caption": limpiar_caption(text) if text else None,
+        "media_type": None,
+        "clave": None,
+        "duplicado": False,
+        "file_id": None
+    }
+    if item["omitir"]:
+        return item
+
+    item["clave"] = clave_mensaje(msg, item["caption"])
+    previo = indice.buscar(destino, item["clave"]) if destino is not None and dedup != DESACTIVADO else None
+    if previo:
+        item["duplicado"] = True
+        if dedup == REENVIAR and previo["file_id"]:
+            item["file_id"] = previo["file_id"]
+            item["media_type"] = previo["tipo"]
+            item["copiar"] = False
+        else:
+            item["omitir"] = True
+        return item
+
+    if item["copiar"] or not msg.media:
+        return item
+
+    tamano = getattr(media_de(msg), "file_size", 0) or 0
+    async with espacio.reserva(tamano):
+        media_path = await sesiones.descargar(
+            msg,
+            file_name=carpeta.destino(tamano) if carpeta else None,
+            progress=progress,
+            progress_args=(None, f"Descarga {msg.id}")
+        )
+    if not media_path:
+        return item
+
+    nombre_original = os.path.basename(media_path)
+    nombre_limpio = limpiar_nombre_archivo(nombre_original)
+    if nombre_original != nombre_limpio:
+        nuevo_path = os.path.join(os.path.dirname(media_path), nombre_limpio)
+        os.rename(media_path, nuevo_path)
+        media_path = nuevo_path
+
+    item["media_path"] = media_path
+    item["media_type"] = determine_media_type(media_path)
+
+    if item["media_type"] == "video":
+        video_info = await info_video(media_path)
+        item["video_info"] = video_info
+        item["thumbnail_path"] = await obtener_miniatura(client, msg, media_path, video_info, miniatura)
+    return item
+
+async def enviar_mensaje(client, item, common_params):
+    """Publica en el destino un mensaje preparado por preparar_mensaje"""
+    media_type = item["media_type"]
+    media_path = item["media_path"]
+    caption = item["caption"]
+
+    enviado = None
+    if item["file_id"]:
+        enviado = await limitador.ejecutar(
+            "send", client.send_cached_media,
+            **common_params,
+            file_id=item["file_id"],
+            caption=caption
+        )
+    elif item["copiar"]:
+        enviado = await limitador.ejecutar(
+            "send", client.copy_message,
+            **common_params,
+            from_chat_id=item["msg"].chat.id,
+            message_id=item["msg"].id,
+            caption=caption
+        )
+    elif media_type == "video":
+        video_info = item["video_info"]
+        thumbnail_path = item["thumbnail_path"]
+        enviado = await limitador.ejecutar(
+            "send", client.send_video,
+            **common_params,
+            video=media_path,
+            caption=caption,
+            duration=int(video_info['duration']),
+            width=video_info['width'],
+            height=video_info['height'],
+            thumb=thumbnail_path,
+            progress=progress,
+            progress_args=(None, f"Subida {item['msg'].id}")
+        )
+    elif media_type == "photo":
+        enviado = await limitador.ejecutar(
+            "send", client.send_photo,
+            **common_params,
+            photo=media_path,
+            caption=caption
+        )
+    elif media_type == "document":
+        enviado = await limitador.ejecutar(
+            "send", client.send_document,
+            **common_params,
+            document=media_path,
+            caption=caption,
+            progress=progress,
+            progress_args=(None, f"Subida {item['msg'].id}")
+        )
+    elif caption:
+        enviado = await limitador.ejecutar(
+            "send", client.send_message,
+            **common_params,
+            text=caption,
+            disable_web_page_preview=True
+        )
+    return enviado
+
+def ya_entregado(msg, destino, dedup):
+    """Indica si el indice tiene el mensaje como entregado en `destino`"""
+    if destino is None or dedup == DESACTIVADO:
+        return False
+    text = msg.text or msg.caption
+    return indice.buscar(destino, clave_mensaje(msg, limpiar_caption(text) if text else None)) is not None
+
+async def album_completo(client, grupo):
+    """Indica si `grupo` contiene todos los mensajes de su album original"""
+    try:
+        album = await limitador.ejecutar("get", client.get_media_group, grupo[0].chat.id, grupo[0].id)
+    except Exception as e:
+        print(f"No se pudo comprobar el album de {grupo[0].id}: {e}")
+        return False
+    return {msg.id for msg in album} == {msg.id for msg in grupo}
+
+async def preparar_grupo(client, grupo, copiar=False, destino=None, dedup=DESACTIVADO, miniatura=MINIATURA_MODO, carpeta=None):
+    """Prepara un mensaje suelto o todos los mensajes de un album"""
+    opciones = {"destino": destino, "dedup": dedup, "miniatura": miniatura, "carpeta": carpeta}
+    if len(grupo) == 1:
+        return await preparar_mensaje(client, grupo[0], copiar=copiar, **opciones)
+
+    copiar = copiar and all(puede_copiarse(msg) for msg in grupo)
+    # copy_media_group copia el album entero: si alguna parte ya se entrego,
+    # el album se descarga y sale por send_media_group, que la omite o la
+    # reenvia por file_id
+    if copiar and any(ya_entregado(msg, destino, dedup) for msg in grupo):
+        copiar = False
+    # Lo mismo si el rango de mensajes corta el album por un extremo: se
+    # copiarian partes que no se han pedido
+    if copiar and not await album_completo(client, grupo):
+        copiar = False
+    # Los elementos del album se descargan en paralelo
+    resultados = await asyncio.gather(
+        *(preparar_mensaje(client, msg, copiar=copiar, **opciones) for msg in grupo),
+        return_exceptions=True
+    )
+    errores = [r for r in resultados if isinstance(r, BaseException)]
+    if errores:
+        for resultado in resultados:
+            if not isinstance(resultado, BaseException):
+                limpiar_item(resultado)
+        raise errores[0]
+
+    return {
+        "msg": grupo[0],
+        "album": resultados,
+        "omitir": all(r["omitir"] for r in resultados),
+        "duplicado": all(r["duplicado"] for r in resultados),
+        "copiar": copiar
+    }
+
+def descarga_fallida(item):
+    """Indica si falta algun archivo que se debia descargar"""
+    items = item.get("album") or [item]
+    return any(
+        i["msg"].media and not (i["omitir"] or i["copiar"] or i["media_path"] or i["file_id"])
+        for i in items
+    )
+
+def input_media(item):
+    """Convierte un elemento preparado en el InputMedia de send_media_group"""
+    caption = item["caption"] or ""
+    if item["file_id"]:
+        if item["media_type"] == "video":
+            return InputMediaVideo(media=item["file_id"], caption=caption)
+        if item["media_type"] == "photo":
+            return InputMediaPhoto(media=item["file_id"], caption=caption)
+        return InputMediaDocument(media=item["file_id"], caption=caption)
+    if item["media_type"] == "video":
+        video_info = item["video_info"]
+        thumbnail_path = item["thumbnail_path"]
+        return InputMediaVideo(
+            media=item["media_path"],
+            caption=caption,
+            duration=int(video_info['duration']),
+            width=video_info['width'],
+            height=video_info['height'],
+            thumb=thumbnail_path
+        )
+    if item["media_type"] == "photo":
+        return InputMediaPhoto(media=item["media_path"], caption=caption)
+    return InputMediaDocument(media=item["media_path"], caption=caption)
+
+async def enviar_grupo(client, item, common_params):
+    """Publica un mensaje suelto o un album completo con una sola llamada.
+    Devuelve pares (elemento, mensaje enviado) para el indice de entregas"""
+    if "album" not in item:
+        return [(item, await enviar_mensaje(client, item, common_params))]
+
+    # preparar_grupo solo deja copiar albumes completos, asi que cada
+    # elemento se corresponde con el mensaje copiado en su misma posicion
+    if item["copiar"]:
+        items = item["album"]
+        enviados = await limitador.ejecutar(
+            "send", client.copy_media_group,
+            **common_params,
+            from_chat_id=item["msg"].chat.id,
+            message_id=item["msg"].id,
+            captions=[i["caption"] or "" for i in items]
+        )
+        return list(zip(items, enviados))
+
+    # Los elementos ya entregados se quedan fuera del album
+    items = [i for i in item["album"] if not i["omitir"]]
+    if len(items) == 1:
+        return [(items[0], await enviar_mensaje(client, items[0], common_params))]
+    enviados = await limitador.ejecutar(
+        "send", client.send_media_group,
+        **common_params,
+        media=[input_media(i) for i in items]
+    )
+    return list(zip(items, enviados))
+
+def limpiar_item(item):
+    """Borra los archivos temporales de un mensaje preparado"""
+    if not item:
+        return
+    for parte in item.get("album") or []:
+        limpiar_item(parte)
+    for file_path in [item.get("media_path"), item.get("thumbnail_path")]:
+        if file_path and os.path.exists(file_path):
+            os.remove(file_path)
+
+async def ejecutar_urlsave(client, trabajo, status_msg, info_msg=None):
+    """Ejecuta o reanuda un trabajo de -urlsave registrado en el diario"""
+    await listado.esperar()
+    params = trabajo.params
+    chat_id = params["chat_id"]
+    fin = params["message_id"] + params["count"]
+    inicio = params["message_id"] if trabajo.ultimo_id is None else trabajo.ultimo_id + 1
+    topic_id = params["topic_id"]
+    start_time = datetime.datetime.now()
+
+    common_params = {
+        "chat_id": params["target_channel"],
+        "message_thread_id": params["target_topic"]
+    }
+
+    # Las descargas de los siguientes mensajes se solapan con la subida del actual.
+    # Los albumes viajan como un unico elemento del pipeline.
+    dedup = params.get("dedup", DESACTIVADO)
+    duplicados = 0
+    carpeta = espacio.abrir(f"trabajo-{trabajo.id}")
+
+    async def preparar(grupo):
+        return await preparar_grupo(
+            client, grupo,
+            copiar=params["copiar"],
+            destino=params["target_channel"],
+            dedup=dedup,
+            miniatura=params.get("miniatura", MINIATURA_MODO),
+            carpeta=carpeta
+        )
+
+    def avanzar(grupo, exito):
+        for msg in grupo:
+            trabajo.avanzar(msg.id, exito)
+
+    async def consumir(grupo, tarea):
+        nonlocal duplicados
+        try:
+            item = await tarea
+
+            if item["omitir"]:
+                if item["duplicado"]:
+                    duplicados += len(grupo)
+                avanzar(grupo, None)
+                return
+
+            if descarga_fallida(item):
+                await limitador.ejecutar("edit", status_msg.edit, f"**[7²2„1‚5]** No se pudo descargar el contenido multimedia.")
+                raise TransferenciaAbortada()
+
+            for parte, enviado in await enviar_grupo(client, item, common_params):
+                indice.registrar(params["target_channel"], parte["clave"], enviado)
+            avanzar(grupo, True)
+
+        except FloodWait as e:
+            # El limitador ya agoto sus reintentos para este mensaje
+            await limitador.ejecutar("edit", status_msg.edit, f"**[77]** Esperando {e.value} segundos debido a limitaciones de Telegram...")
+            await asyncio.sleep(e.value)
+            avanzar(grupo, None)
+        except (
+            TransferenciaAbortada,
+            ChannelBanned,
+            ChannelInvalid,
+            ChannelPrivate,
+            ChatIdInvalid,
+            ChatInvalid,
+        ):
+            raise
+        except Exception as ex:
+            avanzar(grupo, False)
+        finally:
+            if tarea.done() and not tarea.cancelled() and tarea.exception() is None:
+                limpiar_item(tarea.result())
+
+    try:
+        await pipeline_ordenado(
+            agrupar_albumes(PrefetchMensajes(client, chat_id, inicio, fin - inicio)),
+            preparar,
+            consumir,
+            en_vuelo=URLSAVE_EN_VUELO,
+            descartar=limpiar_item
+        )
+    except (
+        ChannelBanned,
+        ChannelInvalid,
+        ChannelPrivate,
+        ChatIdInvalid,
+        ChatInvalid,
+    ):
+        trabajo.terminar(FALLIDO)
+        await (info_msg or status_msg).edit("Estas unido a ese canal?")
+        return
+    except TransferenciaAbortada:
+        trabajo.terminar(FALLIDO)
+        return
+    except asyncio.CancelledError:
+        trabajo.terminar(CANCELADO)
+        raise
+    except Exception:
+        trabajo.terminar(FALLIDO)
+        raise
+    finally:
+        await espacio.cerrar(carpeta)
+
+    trabajo.ultimo_id = fin - 1
+    trabajo.terminar()
+
+    elapsed_time = datetime.datetime.now() - start_time
+    final_text = (
+        f"**[”9Ö0]** Proceso completado (trabajo #{trabajo.id}):\n"
+        f"7¼3 Mensajes exitosos: {trabajo.exitos}\n"
+        f"7²2„1‚5 Errores: {trabajo.errores}\n"
+        f"75„1‚5 Tiempo total: {str(elapsed_time).split('.')[0]}"
+    )
+    if duplicados:
+        final_text += f"\n”9Ö0 Ya entregados (omitidos): {duplicados}"
+    if topic_id:
+        final_text += f"\n”9Þ3 Topic ID: {topic_id}"
+    final_text += f"\n”9Ý1 {datetime.datetime.now().strftime('%Y-%m-%d %I:%M:%S %p')}"
+
+    await status_msg.edit(final_text)
+
+@planificado("mirror")
 @handle_errors
 async def save_and_forward_message(client: Client, message: Message):
     if not message.from_user.id in OWNER_ID:
         return
     
     try:
-        if len(message.command) < 2:
-            await message.reply("**[7·4]** Uso: `-urlsave [enlace de Telegram] [cantidad opcional] [channel_id opcional] [topic_id opcional]`")
+        args, opciones = separar_opciones(message.command[1:])
+        if len(args) < 1:
+            await message.reply("**[7·4]** Uso: `-urlsave [enlace de Telegram] [cantidad opcional] [channel_id opcional] [topic_id opcional] [copy=no] [dup=skip|resend|off] [thumb=telegram|ffmpeg|off]`")
             return
 
-        link = message.command[1]
+        link = args[0]
         
         count = 1
         target_channel = TARGET_CHANNEL
         target_topic = None
+        copiar = opcion_activa(opciones.get("copy"), COPIA_DIRECTA)
+        dedup = opciones.get("dup", DEDUP_MODO)
+        miniatura = opciones.get("thumb", MINIATURA_MODO)
         
-        if len(message.command) >= 3:
-            count = int(message.command[2])
-        if len(message.command) >= 4:
-            target_channel = int(message.command[3])
-        if len(message.command) >= 5:
-            target_topic = int(message.command[4])
+        if len(args) >= 2:
+            count = int(args[1])
+        if len(args) >= 3:
+            target_channel = int(args[2])
+        if len(args) >= 4:
+            target_topic = int(args[3])
 
         info_msg = await message.reply(
             f"**[”9Ö0]** Procesando enlace:\n{link}\n"
@@ -767,203 +1533,34 @@ async def save_and_forward_message(client: Client, message: Message):
 
         status_msg = await message.reply(f"**[”9Ö0]** Sacando contenido...")
 
-        private_with_topic = r"https?://t\.me/c/(\d+)/(\d+)/(\d+)"
-        private_pattern = r"https?://t\.me/c/(\d+)/(\d+)"
-        public_pattern = r"https?://t\.me/([\w\d_]+)/(\d+)"
-        bot_pattern = r"https?://t\.me/b/([\w\d_]+)/(\d+)"
-
-        topic_id = None
-        if re.match(private_with_topic, link):
-            match = re.match(private_with_topic, link)
-            chat_id = int("-100" + match.group(1))
-            message_id = int(match.group(3))
-            topic_id = int(match.group(2))
-        elif re.match(private_pattern, link):
-            match = re.match(private_pattern, link)
-            chat_id = int("-100" + match.group(1))
-            message_id = int(match.group(2))
-        elif re.match(public_pattern, link):
-            match = re.match(public_pattern, link)
-            chat_id = match.group(1)
-            message_id = int(match.group(2))
-        elif re.match(bot_pattern, link):
-            match = re.match(bot_pattern, link)
-            chat_id = match.group(1)
-            message_id = int(match.group(2))
-        else:
+        enlace = parsear_enlace(link)
+        if enlace is None:
             await status_msg.edit("**[7·4]** El enlace proporcionado no es v¨¢lido.")
             return
+        chat_id, message_id, topic_id = enlace
         
-        success_count = 0
-        error_count = 0
-        total_messages = count
-        start_time = datetime.datetime.now()
-
-        for i in range(count):
-            try:
-                if success_count > 0 and success_count % 50 == 0:
-                    await status_msg.edit(f"**[77]** Pausa de 1 minutos para evitar flood despu¨¦s de {success_count} mensajes...")
-                    await asyncio.sleep(5)
-
-                current_message_id = message_id + i
-                msg = await client.get_messages(chat_id, current_message_id)
-
-                if not msg:
-                    await message.reply(f"**[7·4]** No se pudo obtener el mensaje con ID: `{current_message_id}`.")
-                    continue
-                
-                if not msg.media and not (msg.text or msg.caption):
-                    continue
-
-                media_path = None
-
-                if msg.media:
-                    media_path = await client.download_media(
-                        msg,
-                    )
-                    await asyncio.sleep(10)
-                    if not media_path:
-                        await status_msg.edit(f"**[7²2„1‚5]** No se pudo descargar el contenido multimedia.")
-                        return
-
-                    nombre_original = os.path.basename(media_path)
-                    nombre_limpio = limpiar_nombre_archivo(nombre_original)
-                    if nombre_original != nombre_limpio:
-                        nuevo_path = os.path.join(os.path.dirname(media_path), nombre_limpio)
-                        os.rename(media_path, nuevo_path)
-                        media_path = nuevo_path
-
-                text = msg.text or msg.caption
-                caption = limpiar_caption(text) if text else None
-
-                media_type = determine_media_type(media_path) if media_path else None
-
-                common_params = {
-                    "chat_id": target_channel,
-                    "message_thread_id": target_topic
-                }
-
-                if media_type == "video":
-                    video_info = get_video_info(media_path)
-                    thumbnail_path = f"{media_path}_thumb.jpg"
-                    (
-                        ffmpeg
-                        .input(media_path, ss=video_info['duration']//2 if video_info['duration'] > 0 else 0)
-                        .filter('scale', 320, -1)
-                        .output(thumbnail_path, vframes=1)
-                        .overwrite_output()
-                        .run(capture_stdout=True, capture_stderr=True)
-                    )
-                    await client.send_video(
-                        **common_params,
-                        video=media_path,
-                        caption=caption,
-                        duration=video_info['duration'],
-                        width=video_info['width'],
-                        height=video_info['height'],
-                        thumb=thumbnail_path if os.path.exists(thumbnail_path) else None,
-                    )
-                    if os.path.exists(thumbnail_path):
-                        os.remove(thumbnail_path)
-                elif media_type == "photo":
-                    await asyncio.sleep(1)
-                    await client.send_photo(
-                        **common_params,
-                        photo=media_path,
-                        caption=caption
-                    )
-                elif media_type == "document":
-                    await asyncio.sleep(10)
-                    await client.send_document(
-                        **common_params,
-                        document=media_path,
-                        caption=caption,
-                    )
-                elif text:
-                    await client.send_message(
-                        **common_params,
-                        text=caption,
-                        disable_web_page_preview=True
-                    )
-
-                if media_path and os.path.exists(media_path):
-                    os.remove(media_path)
-                success_count += 1
-
-                await asyncio.sleep(1)
-            
-            except (
-                ChannelBanned,
-                ChannelInvalid,
-                ChannelPrivate,
-                ChatIdInvalid,
-                ChatInvalid,
-            ):
-                await info_msg.edit("Estas unido a ese canal?")
-                return
-
-            except FloodWait as e:
-                await status_msg.edit(f"**[77]** Esperando {e.value} segundos debido a limitaciones de Telegram...")
-                await asyncio.sleep(e.value)
-            except Exception as ex:
-                error_count += 1
-                
-        elapsed_time = datetime.datetime.now() - start_time
-        final_text = (
-            f"**[”9Ö0]** Proceso completado:\n"
-            f"7¼3 Mensajes exitosos: {success_count}\n"
-            f"7²2„1‚5 Errores: {error_count}\n"
-            f"75„1‚5 Tiempo total: {str(elapsed_time).split('.')[0]}"
-        )
-        if topic_id:
-            final_text += f"\n”9Þ3 Topic ID: {topic_id}"
-        final_text += f"\n”9Ý1 {datetime.datetime.now().strftime('%Y-%m-%d %I:%M:%S %p')}"
-
-        await status_msg.edit(final_text)
+        trabajo = diario.crear("urlsave", {
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "count": count,
+            "target_channel": target_channel,
+            "target_topic": target_topic,
+            "topic_id": topic_id,
+            "copiar": copiar,
+            "dedup": dedup,
+            "miniatura": miniatura
+        })
+        await ejecutar_urlsave(client, trabajo, status_msg, info_msg)
         
     except Exception as ex:
         await message.reply(f"**[7·4]** Error general: {str(ex)}")
 
-class StreamStatusQueue:
-    def __init__(self, message, status_msg, stream_id):
-        self.message = message
-        self.status_msg = status_msg
-        self.stream_id = stream_id
-        self.status_queue = queue.Queue()
-        self.stop_event = threading.Event()
-
-def status_monitor(stream_status_queue, client):
-    while not stream_status_queue.stop_event.is_set():
-        try:
-            try:
-                message_text, is_error = stream_status_queue.status_queue.get(timeout=1)
-            except queue.Empty:
-                continue
-
-            try:
-                asyncio.run(_update_status(
-                    client, 
-                    stream_status_queue.message, 
-                    stream_status_queue.status_msg, 
-                    message_text, 
-                    is_error
-                ))
-            except Exception as e:
-                print(f"Error updating status: {e}")
-        except Exception as e:
-            print(f"Status monitor error: {e}")
-    
-async def _update_status(client, message, status_msg, message_text, is_error):
-    try:
-        await status_msg.edit(message_text)
-    except Exception:
-        await message.reply(message_text)
-
-def configure_ffmpeg(video_path, output_url):
-    video_info = get_video_info(video_path)
+async def configure_ffmpeg(video_path, output_url):
+    video_info = await info_video(video_path)
     video_codec = video_info["video_codec"]
     audio_codec = video_info["audio_codec"]
     pix_fmt = video_info.get("pix_fmt", "")
+    fps = video_info["fps"] or 30
     
     stream = ffmpeg.input(video_path)
     
@@ -973,8 +1570,8 @@ def configure_ffmpeg(video_path, output_url):
         "crf": "20",
         "maxrate": "1200k",
         "bufsize": "2400k",
-        "r": video_info["fps"],
-        "g": int(video_info["fps"] * 2),
+        "r": fps,
+        "g": int(fps * 2),
         "pix_fmt": "yuv420p",
         "audio_bitrate": "96k",
         "ar": "48000",
@@ -1000,38 +1597,42 @@ def configure_ffmpeg(video_path, output_url):
 
     return stream
 
-def stream_video_thread(video_path, stream_url, stream_key, stream_status_queue):
+async def transmitir_video(video_path, output_url, stream_id, status_msg, carpeta):
+    """Ejecuta la transmision como subproceso asincrono hasta que termina o se detiene"""
+    proceso = None
     try:
-        if not os.path.exists(video_path):
-            stream_status_queue.status_queue.put(("**[7·4]** El archivo de video no existe.", True))
-            return
-        
-        output_url = f"{stream_url}{stream_key}"
-   
-        try:
-            stream_status_queue.status_queue.put(("**[”9Ö0]** Iniciando transmisi¨®n...", False))
-            
-            stream = configure_ffmpeg(video_path, output_url)
-            
-            ffmpeg.run(stream, overwrite_output=True)
-            
-            stream_status_queue.status_queue.put(("**[7¼3]** Transmisi¨®n completada.", False))
+        await status_msg.edit("**[”9Ö0]** Iniciando transmisi¨®n...")
+        stream = await configure_ffmpeg(video_path, output_url)
+        proceso = await trabajadores.iniciar(stream)
+        active_streams[stream_id]['proceso'] = proceso
+        await status_msg.edit(f"**[”9Ö0]** Transmisi¨®n iniciada en segundo plano. ID de Stream: `{stream_id}`")
 
-        except ffmpeg.Error as e:
-            error_message = e.stderr.decode() if e.stderr else "Error desconocido en ffmpeg."
-            stream_status_queue.status_queue.put((f"**[7·4„1‚5]** Error al transmitir: {error_message}", True))
-        except Exception as e:
-            stream_status_queue.status_queue.put((f"**[7·4„1‚5]** Error al transmitir: {str(e)}", True))
-    
+        # Solo se guarda el final de stderr para el mensaje de error
+        cola = b""
+        while bloque := await proceso.stderr.read(65536):
+            cola = (cola + bloque)[-4000:]
+        await proceso.wait()
+
+        if active_streams.get(stream_id, {}).get('detenido'):
+            return
+        if proceso.returncode == 0:
+            await status_msg.edit("**[7¼3]** Transmisi¨®n completada.")
+        else:
+            lineas = cola.decode(errors="replace").strip().splitlines()
+            error_message = lineas[-1] if lineas else "Error desconocido en ffmpeg."
+            await status_msg.edit(f"**[7·4„1‚5]** Error al transmitir: {error_message}")
+    except asyncio.CancelledError:
+        if proceso:
+            await trabajadores.terminar(proceso)
+        raise
+    except Exception as e:
+        with suppress(Exception):
+            await status_msg.edit(f"**[7·4„1‚5]** Error al transmitir: {str(e)}")
     finally:
-        if os.path.exists(video_path):
-            os.remove(video_path)
-        
-        if stream_status_queue.stream_id in active_streams:
-            del active_streams[stream_status_queue.stream_id]
-        
-        stream_status_queue.stop_event.set()
+        await espacio.cerrar(carpeta)
+        active_streams.pop(stream_id, None)
 
+@planificado("stream")
 @handle_errors
 async def stream_video(client: Client, message: Message):
     if message.from_user.id not in OWNER_ID:
@@ -1053,36 +1654,26 @@ async def stream_video(client: Client, message: Message):
         
         status_msg = await message.reply(f"**[”9Ö0]** Descargando video para transmisi¨®n. ID de Stream: `{stream_id}`")
         await message.reply(f'`-stopstream {stream_id}`')
-        video_path = await client.download_media(
-            message.reply_to_message.video,
-        )
+        carpeta = espacio.abrir(f"stream-{stream_id}")
+        video = message.reply_to_message.video
+        async with carpeta.reserva(video.file_size):
+            video_path = await sesiones.descargar(
+                message.reply_to_message,
+                file_name=carpeta.destino()
+            )
         
-        if not os.path.exists(video_path):
+        if not video_path or not os.path.exists(video_path):
+            await espacio.cerrar(carpeta)
             await status_msg.edit("**[7·4]** Error: No se pudo descargar el video.")
             return
         
-        stream_status_queue = StreamStatusQueue(message, status_msg, stream_id)
-        
-        monitor_thread = threading.Thread(
-            target=status_monitor, 
-            args=(stream_status_queue, client),
-            daemon=True
-        )
-        monitor_thread.start()
-        
-        streaming_thread = threading.Thread(
-            target=stream_video_thread, 
-            args=(video_path, stream_url, stream_key, stream_status_queue),
-            daemon=True
+        active_streams[stream_id] = {'proceso': None, 'detenido': False}
+        active_streams[stream_id]['tarea'] = asyncio.create_task(
+            transmitir_video(video_path, f"{stream_url}{stream_key}", stream_id, status_msg, carpeta)
         )
-        streaming_thread.start()
-        
-        active_streams[stream_id] = {
-            'thread': streaming_thread,
-            'stop_event': stream_status_queue.stop_event
-        }
-        
-        await status_msg.edit(f"**[”9Ö0]** Transmisi¨®n iniciada en segundo plano. ID de Stream: `{stream_id}`")
+        # El handler espera a la transmision para que ocupe su hueco en el planificador
+        with suppress(asyncio.CancelledError):
+            await active_streams[stream_id]['tarea']
     
     except Exception as ex:
         await message.reply(f"**[7·4]** Error general: {ex}")
@@ -1103,9 +1694,12 @@ async def stop_stream(client: Client, message: Message):
         return
     
     try:
-        active_streams[stream_id]['stop_event'].set()
-        active_streams[stream_id]['thread'].join(timeout=1)
-        del active_streams[stream_id]
+        stream = active_streams[stream_id]
+        stream['detenido'] = True
+        if stream['proceso']:
+            await trabajadores.terminar(stream['proceso'])
+        else:
+            stream['tarea'].cancel()
         await message.reply(f"**[7¼3]** Stream con ID `{stream_id}` detenido exitosamente.")
     
     except Exception as ex:
@@ -1114,16 +1708,16 @@ async def stop_stream(client: Client, message: Message):
 @handle_errors
 async def clear(client: Client, message: Message):
     try:
-        if os.path.exists('downloads'):
-            shutil.rmtree('downloads')
-            await message.reply(f'A sido limpiado todo')
-            print(f"La carpeta downloads ha sido eliminada.")
-        
-        os.makedirs('downloads')
-        print(f"La carpeta downloads_path ha sido creada nuevamente.")
-        await message.reply(f'Creada la carpeta')
+        # Las carpetas de trabajos en curso se conservan
+        entradas, liberado = await asyncio.to_thread(espacio.limpiar)
+        en_uso = len(espacio.carpetas)
+        await message.reply(
+            f"**[7¼3]** Limpieza completada: {entradas} elementos eliminados ({human_readable_size(liberado)})."
+            + (f"\n**[”9Ö0]** {en_uso} carpetas en uso por trabajos activos se conservaron." if en_uso else "")
+        )
     except Exception as e:
         print(f"Hubo un error: {e}")
+        await message.reply(f"**[7·4]** Error al limpiar: `{str(e)}`")
 
 @handle_errors
 async def gemini(client: Client, message: Message):
@@ -1160,8 +1754,7 @@ async def gemini(client: Client, message: Message):
         respuesta = await generar_respuesta(prompt)
         respuesta_fragmentos = dividir_respuesta(respuesta)
         for fragmento in respuesta_fragmentos:
-            await message.reply(fragmento)
-            time.sleep(1)
+            await limitador.ejecutar("send", message.reply, fragmento)
         await mm.delete(True)
 
 @handle_errors
@@ -1193,6 +1786,7 @@ async def gemini_audio(client: Client, message: Message):
     except Exception as e:
         await message.reply(f"**[7·4]** Error al generar o subir audio: {str(e)}")
 
+@planificado("ia")
 @handle_errors
 async def gemini_file(client: Client, message: Message):
     if message.from_user.id not in OWNER_ID:
@@ -1200,16 +1794,20 @@ async def gemini_file(client: Client, message: Message):
     if not message.reply_to_message or not message.reply_to_message.document:
         await message.reply("**[7·4]** Debes responder a un documento.")
         return
+    carpeta = espacio.abrir(f"aifile-{message.id}")
     try:
         try:
             audio = message.text.split("|")[-1]
         except:
             audio = 'no'
-        salida_audio= 'respuesta.mp3'
+        salida_audio = os.path.join(carpeta.ruta, 'respuesta.mp3')
+        media = message.reply_to_message.document
         if audio == 'audio':
             msg = await message.reply("**[”9Ö0]** Descargando archivo...")
-            media = message.reply_to_message.document
-            media_path = await client.download_media(media, file_name=media.file_name)
+            async with carpeta.reserva(media.file_size):
+                media_path = await client.download_media(
+                    media, file_name=os.path.join(carpeta.destino(media.file_size or 0), media.file_name or "")
+                )
             prompt = message.text.split(" ", 1)[1] if len(message.text.split(" ", 1)) > 1 else None
             if not prompt:
                 await msg.edit("**[7·4]** Por favor proporciona un texto para generar la respuesta.")
@@ -1221,13 +1819,13 @@ async def gemini_file(client: Client, message: Message):
             await generar_audio(respuesta_formateada, 'es', salida_audio)
             with open(salida_audio, 'rb') as f:
                 await message.reply_voice(f)
-            os.remove(salida_audio)
-            os.remove(media_path)
             await msg.delete(True)
         else:
             msg = await message.reply("**[”9Ö0]** Descargando archivo...")
-            media = message.reply_to_message.document
-            media_path = await client.download_media(media, file_name=media.file_name)
+            async with carpeta.reserva(media.file_size):
+                media_path = await client.download_media(
+                    media, file_name=os.path.join(carpeta.destino(media.file_size or 0), media.file_name or "")
+                )
             prompt = message.text.split(" ", 1)[1] if len(message.text.split(" ", 1)) > 1 else None
             if not prompt:
                 await msg.edit("**[7·4]** Por favor proporciona un texto para generar la respuesta.")
@@ -1237,11 +1835,11 @@ async def gemini_file(client: Client, message: Message):
             await msg.delete(True)
             split = dividir_respuesta(response)
             for fragmento in split:
-                await message.reply(fragmento)
-                time.sleep(1)
-            os.remove(media_path)
+                await limitador.ejecutar("send", message.reply, fragmento)
     except Exception as ex:
         await message.reply(f"**[7·4]** Error al procesar su archivo: {ex}")
+    finally:
+        await espacio.cerrar(carpeta)
 
 @handle_errors
 async def gemini_image(client: Client, message: Message):
@@ -1376,28 +1974,30 @@ async def auto_unset_afk(client: Client, message: Message):
         await asyncio.sleep(5)
         await reply.delete()
 
+@planificado("mirror")
 @handle_errors
 async def save_forward_message(client: Client, message: Message):
     if not message.from_user.id in OWNER_ID:
         return
     
     try:
-        if len(message.command) < 4:
-            await message.reply("**[7·4]** Uso: `-save [id_canal_origen] [id_mensaje_inicial] [cantidad de mensajes] [id_canal_destino] [topic_id(opcional)]`")
+        args, opciones = separar_opciones(message.command[1:])
+        if len(args) < 3:
+            await message.reply("**[7·4]** Uso: `-save [id_canal_origen] [id_mensaje_inicial] [cantidad de mensajes] [id_canal_destino] [topic_id(opcional)] [dup=skip|off]`")
             return
         try:
-            source_channel = int(message.command[1])
-            start_id = int(message.command[2])
-            count = int(message.command[3])
-            destination_channel = int(message.command[4])
+            source_channel = int(args[0])
+            start_id = int(args[1])
+            count = int(args[2])
+            destination_channel = int(args[3])
         except Exception as e:
             await message.reply(f"**[7·4]** Error: {e}")
             return
 
         topic_id = None 
-        if len(message.command) > 5:
+        if len(args) > 4:
             try:
-                topic_id = int(message.command[5])
+                topic_id = int(args[4])
             except ValueError:
                 await message.reply("**[7·4]** El ID del tema debe ser un n¨²mero entero.")
                 return
@@ -1408,76 +2008,240 @@ async def save_forward_message(client: Client, message: Message):
         status_text += "..."
         status_msg = await message.reply(status_text)
 
-        success_count = 0
-        error_count = 0
-        total_messages = count
-        start_time = datetime.datetime.now()
+        trabajo = diario.crear("save", {
+            "source_channel": source_channel,
+            "start_id": start_id,
+            "count": count,
+            "destination_channel": destination_channel,
+            "topic_id": topic_id,
+            "dedup": opciones.get("dup", DEDUP_MODO)
+        })
+        await ejecutar_save(client, trabajo, status_msg)
 
-        for current_message_id in range(start_id, start_id + count):
-            try:
-                if success_count > 0 and success_count % 100 == 0:
-                    await status_msg.edit(f"**[77]** Pausa de 5 segundos para evitar flood despu¨¦s de {success_count} mensajes...")
-                    await asyncio.sleep(5)
-                
-                msg = await client.get_messages(source_channel, current_message_id)
-                if not msg or msg.empty:
-                    print(f"Mensaje {current_message_id} no encontrado o vac¨ªo")
-                    error_count += 1
-                    continue
-
-                forward_params = {
-                    "chat_id": destination_channel,
-                    "from_chat_id": source_channel,
-                    "message_ids": current_message_id,
-                    "disable_notification": True,
-                    "hide_sender_name": True
-                }
-                if topic_id:
-                    forward_params["message_thread_id"] = topic_id
-
-                await asyncio.sleep(3)
-                await client.forward_messages(**forward_params)
-                success_count += 1
-
-                if success_count % 10 == 0:
-                    progress = (success_count / total_messages) * 100
-                    progress_bar = "¨€" * int(progress / 5) + "7™4" * (20 - int(progress / 5))
-                    
-                    progress_text = (
-                        f"**[”9Ö0]** Progreso: {progress:.1f}%\n"
-                        f"```\n{progress_bar}```\n"
-                        f"7¼3 Reenviados: {success_count}/{total_messages}\n"
-                        f"7²2„1‚5 Errores: {error_count}\n"
-                        f"”9ã4 ID actual: {current_message_id}"
-                    )
-                    if topic_id:
-                        progress_text += f"\n”9Þ3 Topic ID: {topic_id}"
-                    
-                    await status_msg.edit(progress_text)
-
-            except FloodWait as fw:
-                await status_msg.edit(f"**[77]** Esperando {fw.x} segundos debido a limitaciones de Telegram...")
-                await asyncio.sleep(fw.value)
-            except Exception as e:
-                error_count += 1
-                print(f"Error reenviando mensaje {current_message_id}: {str(e)}")
+    except Exception as e:
+        await message.reply(f"**[7·4]** Error: {e}")
+
+async def ejecutar_save(client, trabajo, status_msg):
+    """Ejecuta o reanuda un trabajo de -save registrado en el diario"""
+    params = trabajo.params
+    source_channel = params["source_channel"]
+    destination_channel = params["destination_channel"]
+    topic_id = params["topic_id"]
+    total_messages = params["count"]
+    fin = params["start_id"] + params["count"]
+    inicio = params["start_id"] if trabajo.ultimo_id is None else trabajo.ultimo_id + 1
+    dedup = params.get("dedup", DESACTIVADO)
+    duplicados = 0
+    start_time = datetime.datetime.now()
+
+    forward_params = {
+        "chat_id": destination_channel,
+        "from_chat_id": source_channel,
+        "disable_notification": True,
+        "hide_sender_name": True
+    }
+    if topic_id:
+        forward_params["message_thread_id"] = topic_id
+
+    mensajes = None
+
+    async def lotes():
+        """Ids a reenviar en ventanas de FORWARD_LOTE. Sin deduplicacion no se
+        leen los mensajes: el servidor ignora los ids vacios o inexistentes"""
+        nonlocal mensajes, duplicados
+        if dedup != OMITIR:
+            for desde in range(inicio, fin, FORWARD_LOTE):
+                yield list(range(desde, min(desde + FORWARD_LOTE, fin)))
+            return
+        mensajes = PrefetchMensajes(client, source_channel, inicio, fin - inicio)
+        lote = []
+        async for msg in mensajes:
+            if indice.buscar(destination_channel, clave_mensaje(msg)):
+                duplicados += 1
                 continue
+            lote.append(msg.id)
+            if len(lote) == FORWARD_LOTE:
+                yield lote
+                lote = []
+        if lote:
+            yield lote
+
+    async def reenviar_uno(message_id):
+        try:
+            enviado = await limitador.ejecutar("forward", client.forward_messages, **forward_params, message_ids=message_id)
+        except Exception as e:
+            print(f"Error reenviando mensaje {message_id}: {str(e)}")
+            return []
+        return [enviado] if enviado else []
 
-        elapsed_time = datetime.datetime.now() - start_time
-        final_text = (
-            f"**[”9Ö0]** Tarea completada!\n"
-            f"7¼3 Mensajes reenviados: {success_count}\n"
-            f"7²2„1‚5 Errores: {error_count}\n"
-            f"75„1‚5 Tiempo total: {str(elapsed_time).split('.')[0]}"
+    try:
+        async for ids in lotes():
+            while True:
+                try:
+                    enviados = await limitador.ejecutar("forward", client.forward_messages, **forward_params, message_ids=ids)
+                    break
+                except FloodWait as fw:
+                    await limitador.ejecutar("edit", status_msg.edit, f"**[77]** Esperando {fw.value} segundos debido a limitaciones de Telegram...")
+                    await asyncio.sleep(fw.value)
+                except Exception as e:
+                    # Si falla el lote entero se reenvia id a id para saber cuales fallan
+                    print(f"Error reenviando el lote {ids[0]}-{ids[-1]}, se reintenta por separado: {str(e)}")
+                    enviados = []
+                    for message_id in ids:
+                        enviados += await reenviar_uno(message_id)
+                    break
+
+            for enviado in enviados:
+                indice.registrar(destination_channel, clave_mensaje(enviado), enviado)
+            # Los ids que el servidor no devuelve (vacios, de servicio o fallidos) cuentan como errores
+            trabajo.avanzar_lote(ids[-1], exitos=len(enviados), errores=len(ids) - len(enviados))
+
+            progress = min(100, (trabajo.exitos / total_messages) * 100)
+            progress_bar = "¨€" * int(progress / 5) + "7™4" * (20 - int(progress / 5))
+
+            progress_text = (
+                f"**[”9Ö0]** Progreso: {progress:.1f}%\n"
+                f"```\n{progress_bar}```\n"
+                f"7¼3 Reenviados: {trabajo.exitos}/{total_messages}\n"
+                f"7²2„1‚5 Errores: {trabajo.errores}\n"
+                f"”9ã4 ID actual: {ids[-1]}"
+            )
+            if topic_id:
+                progress_text += f"\n”9Þ3 Topic ID: {topic_id}"
+
+            with suppress(Exception):
+                await limitador.ejecutar("edit", status_msg.edit, progress_text)
+    except asyncio.CancelledError:
+        trabajo.terminar(CANCELADO)
+        raise
+    except Exception:
+        trabajo.terminar(FALLIDO)
+        raise
+
+    # Los ids vacios o de servicio se siguen contando como errores
+    if mensajes is not None:
+        trabajo.errores += mensajes.omitidos
+    trabajo.ultimo_id = fin - 1
+    trabajo.terminar()
+
+    elapsed_time = datetime.datetime.now() - start_time
+    final_text = (
+        f"**[”9Ö0]** Tarea completada! (trabajo #{trabajo.id})\n"
+        f"7¼3 Mensajes reenviados: {trabajo.exitos}\n"
+        f"7²2„1‚5 Errores: {trabajo.errores}\n"
+        f"75„1‚5 Tiempo total: {str(elapsed_time).split('.')[0]}"
+    )
+    if duplicados:
+        final_text += f"\n”9Ö0 Ya entregados (omitidos): {duplicados}"
+    if topic_id:
+        final_text += f"\n”9Þ3 Topic ID: {topic_id}"
+    final_text += f"\n”9Ý1 {datetime.datetime.now().strftime('%Y-%m-%d %I:%M:%S %p')}"
+    
+    await status_msg.edit(final_text)
+
+# Ejecutores de cada tipo de trabajo del diario
+EJECUTORES = {
+    "urlsave": ejecutar_urlsave,
+    "save": ejecutar_save,
+}
+
+async def ejecutar_trabajo(client, trabajo, status_msg=None):
+    """Ejecuta un trabajo reanudado, avisando por mensajes guardados"""
+    try:
+        if status_msg is None:
+            desde = trabajo.ultimo_id + 1 if trabajo.ultimo_id is not None else "el inicio"
+            status_msg = await client.send_message(
+                "me",
+                f"**[”9Ö0]** Reanudando trabajo #{trabajo.id} ({trabajo.tipo}) desde {desde}..."
+            )
+        await EJECUTORES[trabajo.tipo](client, trabajo, status_msg)
+    except Exception as ex:
+        print(f"Error en el trabajo #{trabajo.id}: {ex}")
+        await client.send_message("me", f"**[7·4]** Error en el trabajo #{trabajo.id}: `{ex}`")
+
+async def reanudar_trabajos():
+    """Reanuda los trabajos que quedaron activos al reiniciar el bot"""
+    for trabajo_id in diario.pendientes():
+        planificador.encolar("mirror", f"Reanudar trabajo #{trabajo_id}", reanudar_en_cola(trabajo_id))
+
+async def reanudar_en_cola(trabajo_id):
+    """El trabajo se marca en curso al salir de la cola, no al encolarlo:
+    si se cancela mientras espera, -resume puede volver a lanzarlo"""
+    trabajo = diario.reanudar(trabajo_id)
+    if trabajo:
+        await ejecutar_trabajo(bot, trabajo)
+
+@handle_errors
+async def list_jobs(client: Client, message: Message):
+    trabajos = diario.listar()
+    if not trabajos:
+        await message.reply("**[”9Ö0]** No hay trabajos registrados.")
+        return
+    lineas = ["**[”9Ö0] Trabajos:**\n"]
+    for trabajo in trabajos:
+        en_curso = " (en curso)" if trabajo.id in diario.en_curso else ""
+        lineas.append(
+            f"`#{trabajo.id}` {trabajo.tipo} - {trabajo.estado}{en_curso}\n"
+            f"©Ä 7¼3 {trabajo.exitos} | 7²2„1‚5 {trabajo.errores} | ”9ã4 {trabajo.ultimo_id or '-'}\n"
         )
-        if topic_id:
-            final_text += f"\n”9Þ3 Topic ID: {topic_id}"
-        final_text += f"\n”9Ý1 {datetime.datetime.now().strftime('%Y-%m-%d %I:%M:%S %p')}"
-        
-        await status_msg.edit(final_text)
+    await message.reply("".join(lineas))
 
-    except Exception as e:
-        await message.reply(f"**[7·4]** Error: {e}")
+@handle_errors
+async def list_queue(client: Client, message: Message):
+    corriendo, en_cola = planificador.listar()
+    if not corriendo and not en_cola:
+        await message.reply("**[”9Ö0]** No hay tareas en cola ni en ejecucion.")
+        return
+    lineas = [f"**[”9Ö0] En ejecucion ({len(corriendo)}):**"]
+    for tarea in corriendo:
+        progreso = f"\n©Ä {tarea.progreso}" if tarea.progreso else ""
+        lineas.append(
+            f"`#{tarea.id}` [{tarea.tipo}] {tarea.descripcion} - "
+            f"{str(datetime.timedelta(seconds=int(tarea.duracion)))}{progreso}"
+        )
+    if en_cola:
+        lineas.append(f"\n**[77] En cola ({len(en_cola)}):**")
+        for tarea in en_cola:
+            lineas.append(
+                f"`#{tarea.id}` [{tarea.tipo}] {tarea.descripcion} - "
+                f"esperando {str(datetime.timedelta(seconds=int(tarea.espera)))}"
+            )
+    await message.reply("\n".join(lineas))
+
+@handle_errors
+async def cancel_task(client: Client, message: Message):
+    if len(message.command) < 2 or not message.command[1].isdigit():
+        await message.reply("**[7·4]** Uso: `-cancel [id_tarea]`")
+        return
+    tarea = planificador.cancelar(int(message.command[1]))
+    if not tarea:
+        await message.reply("**[7·4]** No hay ninguna tarea con ese ID.")
+        return
+    await message.reply(f"**[7¼3]** Tarea `#{tarea.id}` ({tarea.tipo}) cancelada.")
+
+@handle_errors
+async def list_transfers(client: Client, message: Message):
+    lineas = [telemetria.resumen()]
+    lineas.append("\n**Sesiones:**")
+    for sesion in sesiones.estado():
+        estado = "ok" if sesion["disponible"] else "en pausa"
+        lineas.append(f"• {sesion['nombre']}: {sesion['activas']} activas, {sesion['transferencias']} hechas ({estado})")
+    tasas = ", ".join(f"{clase} {datos['tasa']:.2f}/s" for clase, datos in limitador.estado().items())
+    lineas.append(f"\n**Limitador:** {tasas}")
+    await message.reply("**[”9Ö0] Transferencias:**\n\n" + "\n".join(lineas))
+
+@planificado("mirror")
+@handle_errors
+async def resume_job(client: Client, message: Message):
+    if len(message.command) < 2 or not message.command[1].isdigit():
+        await message.reply("**[7·4]** Uso: `-resume [id_trabajo]`")
+        return
+    trabajo = diario.reanudar(int(message.command[1]))
+    if not trabajo:
+        await message.reply("**[7·4]** El trabajo no existe o ya se esta ejecutando.")
+        return
+    status_msg = await message.reply(f"**[”9Ö0]** Reanudando trabajo #{trabajo.id} ({trabajo.tipo})...")
+    await ejecutar_trabajo(client, trabajo, status_msg)
 
 def is_playlist(url):
     return "/playlist/" in url
@@ -1494,6 +2258,7 @@ def spotuserinfo():
     except:
         os.system("echo Y | spotdl --generate-config")
 
+@planificado("music")
 @handle_errors
 async def download_music(client: Client, message: Message):
     if message.from_user.id in OWNER_ID:
@@ -1506,7 +2271,8 @@ async def download_music(client: Client, message: Message):
 
         url = message.command[1]
         status_msg = await message.reply("**[”9ä3] Procesando enlace...**", quote=True)
-        temp_dir = "downloads"
+        carpeta = espacio.abrir(f"music-{message.id}")
+        temp_dir = carpeta.ruta
 
         try:
             client_id, client_secret = spotuserinfo()
@@ -1552,7 +2318,9 @@ async def download_music(client: Client, message: Message):
                 await status_msg.edit(f"**[70] Descargando:** `{song.name}` - `{song.artists[0]}`")
                 file_path_str = None
                 try:
-                    download_path = await asyncio.to_thread(sync_download_song, song, options)
+                    # El tamano no se conoce antes de bajar: solo se espera a estar dentro de la cuota
+                    async with carpeta.reserva(0):
+                        download_path = await asyncio.to_thread(sync_download_song, song, options)
                     _, file_path = download_path
                     file_path_str = str(file_path) if file_path else None
                 except Exception as e:
@@ -1562,7 +2330,8 @@ async def download_music(client: Client, message: Message):
                 if file_path_str and os.path.exists(file_path_str):
                     await status_msg.edit(f"**[”9à2] Subiendo:** `{song.name}` - `{song.artists[0]}`")
                     try:
-                        await client.send_audio(
+                        await limitador.ejecutar(
+                            "send", client.send_audio,
                             chat_id=message.chat.id,
                             audio=file_path_str,
                             caption=f"**T¨ªtulo:** `{song.name}`\n**Artista:** `{song.artists[0]}`\n**0†9lbum:** `{song.album_name}`",
@@ -1596,6 +2365,9 @@ async def download_music(client: Client, message: Message):
             print(f"Error en download_music: {error_msg}")
             await status_msg.edit(f"**[7Ã4] Error:** `{error_msg}`")
 
+        finally:
+            await espacio.cerrar(carpeta)
+
 # Registrar los handlers
 bot.add_handler(MessageHandler(
     ping,
@@ -1658,6 +2430,26 @@ bot.add_handler(MessageHandler(
     save_forward_message,
     filters.command("save", prefixes=['-']) & owner_only
 ))
+bot.add_handler(MessageHandler(
+    list_jobs,
+    filters.command("jobs", prefixes=['-']) & owner_only
+))
+bot.add_handler(MessageHandler(
+    list_queue,
+    filters.command("queue", prefixes=['-']) & owner_only
+))
+bot.add_handler(MessageHandler(
+    cancel_task,
+    filters.command("cancel", prefixes=['-']) & owner_only
+))
+bot.add_handler(MessageHandler(
+    list_transfers,
+    filters.command("transfers", prefixes=['-']) & owner_only
+))
+bot.add_handler(MessageHandler(
+    resume_job,
+    filters.command("resume", prefixes=['-']) & owner_only
+))
 bot.add_handler(MessageHandler(
     download_music,
     filters.command("dlmusic", prefixes=['-']) & owner_only
@@ -1740,6 +2532,11 @@ async def server():
 
 async def main():
     await bot.start()
+    await sesiones.iniciar(bot)
+    # Los trabajos reanudados publican captions y nombres limpios: sin copia
+    # local del listado se espera un poco a la primera descarga
+    await listado.esperar()
+    bot.loop.create_task(reanudar_trabajos())
     print("”9Ö0 Bot Started...")
     bot.loop.create_task(startup_message())
     asyncio.create_task(server())
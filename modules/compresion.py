@@ -0,0 +1,371 @@
+import asyncio
+import glob
+import hashlib
+import inspect
+import json
+import os
+import re
+import shutil
+import time
+
+from modules.config import COMPRESION_SEGMENTOS, COMPRESION_PARALELA_MIN, COMPRESION_BPP
+from modules.db import DB_PATH, conectar
+from modules.media import trabajadores, _nucleos, _entero
+
+# Rutas de -compress segun lo que ya cumple el original
+REMUX = "remux"
+SOLO_AUDIO = "audio"
+TRANSCODIFICAR = "transcode"
+TAMANO_OBJETIVO = "size"
+
+DESCRIPCION_RUTAS = {
+    REMUX: "remux sin recodificar (+faststart)",
+    SOLO_AUDIO: "video copiado, solo se recodifica el audio",
+    TRANSCODIFICAR: "recodificacion completa",
+    TAMANO_OBJETIVO: "dos pasadas con bitrate calculado para el tamano pedido",
+}
+
+# Parte del presupuesto que se reserva para el contenedor (mp4) y el error del encoder
+MARGEN_CONTENEDOR = 0.04
+# Por debajo de este bitrate de video el resultado no es aprovechable
+BITRATE_MINIMO = 64000
+
+UNIDADES = {"b": 1, "kb": 1024, "mb": 1024 ** 2, "gb": 1024 ** 3}
+
+# Codec de ffprobe que produce cada encoder de DEFAULT_COMPRESSION_SETTINGS
+CODECS = {"libx264": "h264", "libx265": "hevc", "libvpx-vp9": "vp9", "libaom-av1": "av1", "libsvtav1": "av1"}
+
+def usar_segmentos(duracion, pedido=None):
+    """Decide el modo: `pedido` (si/no del comando) manda sobre la duracion
+    minima. Por defecto solo se activa si al menos dos trozos pueden
+    codificarse a la vez; con un solo proceso pesado iria en serie y seria
+    mas lento que el modo de un proceso"""
+    if not duracion:
+        return False
+    if pedido is not None:
+        return pedido
+    if trabajadores.cupo_pesados < 2:
+        return False
+    return duracion >= COMPRESION_PARALELA_MIN
+
+def _bitrate(valor):
+    """'48k' -> 48000, '1.5M' -> 1500000"""
+    valor = str(valor).strip().lower()
+    multiplicador = {"k": 1000, "m": 1000000}.get(valor[-1:], 1)
+    try:
+        return int(float(valor.rstrip("km")) * multiplicador)
+    except ValueError:
+        return 0
+
+def tamano_pedido(valor):
+    """'50MB', '1.5gb' o '800k' -> bytes (None si no se entiende)"""
+    encontrado = re.fullmatch(r"\s*([\d.]+)\s*([kmg]?b?)\s*", str(valor).lower())
+    if not encontrado:
+        return None
+    unidad = encontrado.group(2) or "mb"
+    if not unidad.endswith("b"):
+        unidad += "b"
+    try:
+        return int(float(encontrado.group(1)) * UNIDADES[unidad]) or None
+    except ValueError:
+        return None
+
+def bitrate_para_tamano(tamano, duracion, audio_bitrate):
+    """Bitrate de video (bps) para que video + audio quepan en `tamano` bytes.
+    Lanza ValueError si no se conoce la duracion o si el presupuesto no da
+    ni para BITRATE_MINIMO"""
+    if not duracion or duracion <= 0:
+        raise ValueError("no se pudo leer la duracion del video, no se puede calcular el bitrate para size=")
+    total = tamano * 8 * (1 - MARGEN_CONTENEDOR) / duracion
+    video = int(total - _bitrate(audio_bitrate))
+    if video < BITRATE_MINIMO:
+        raise ValueError(
+            f"{tamano / 1024 / 1024:.1f} MB no bastan para {duracion:.0f}s de video "
+            f"(harian falta al menos {(BITRATE_MINIMO + _bitrate(audio_bitrate)) * duracion / 8 / (1 - MARGEN_CONTENEDOR) / 1024 / 1024:.1f} MB)"
+        )
+    return video
+
+def _dimensiones(resolucion):
+    try:
+        ancho, alto = (int(v) for v in resolucion.lower().split("x"))
+        return ancho, alto
+    except ValueError:
+        return 0, 0
+
+def video_cumple(info, ajustes):
+    """El video del original ya esta en el codec, resolucion, fps y bitrate objetivo"""
+    ancho, alto = _dimensiones(ajustes['resolution'])
+    fps = float(ajustes['fps'] or 0)
+    if not (info['width'] and info['height'] and ancho and alto and fps):
+        return False
+    if info['video_codec'] != CODECS.get(ajustes['codec'], ajustes['codec']) or info['pix_fmt'] != "yuv420p":
+        return False
+    # Se compara lado mayor con lado mayor para aceptar videos verticales
+    if max(info['width'], info['height']) > max(ancho, alto) or min(info['width'], info['height']) > min(ancho, alto):
+        return False
+    if info['fps'] > fps + 0.01:
+        return False
+    bitrate_video = info['bitrate'] - info['audio_bitrate']
+    objetivo = COMPRESION_BPP * info['width'] * info['height'] * min(info['fps'] or fps, fps)
+    return 0 < bitrate_video <= objetivo
+
+def audio_cumple(info, ajustes):
+    """Sin audio, o ya en AAC sin pasar del bitrate objetivo (con un 10% de margen)"""
+    if info['audio_codec'] is None:
+        return True
+    return info['audio_codec'] == "aac" and 0 < info['audio_bitrate'] <= _bitrate(ajustes['audio_bitrate']) * 1.1
+
+def decidir_ruta(info, ajustes):
+    """Elige entre remux, recodificar solo el audio o transcodificar todo"""
+    if not video_cumple(info, ajustes):
+        return TRANSCODIFICAR
+    return REMUX if audio_cumple(info, ajustes) else SOLO_AUDIO
+
+async def remuxar(origen, destino, ajustes, ruta, al_progresar):
+    """Copia el video tal cual a un mp4 con +faststart; con SOLO_AUDIO el
+    audio se recodifica a AAC, con REMUX tambien se copia"""
+    audio = ["-c:a", "copy"] if ruta == REMUX else ["-c:a", "aac", "-b:a", ajustes['audio_bitrate']]
+    await trabajadores.ffmpeg_progreso([
+        "-v", "error", "-i", origen,
+        "-map", "0:v:0", "-map", "0:a:0?",
+        "-c:v", "copy", *audio,
+        "-movflags", "+faststart",
+        "-y", destino
+    ], al_progresar, pesado=ruta != REMUX)
+
+def argumentos_video(ajustes, hilos=None, bitrate=None):
+    """Opciones de codificacion de video a partir de DEFAULT_COMPRESSION_SETTINGS.
+    Con `bitrate` se usa ese bitrate medio (VBR limitado) en lugar del CRF"""
+    args = [
+        "-vf", f"scale={ajustes['resolution']},fps={ajustes['fps']}",
+        "-c:v", ajustes['codec'],
+        "-preset", ajustes['preset']
+    ]
+    if bitrate:
+        args += ["-b:v", bitrate, "-maxrate", int(bitrate * 1.5), "-bufsize", bitrate * 2]
+    else:
+        args += ["-crf", ajustes['crf']]
+    if hilos:
+        args += ["-threads", hilos]
+    return args
+
+async def codificar_a_tamano(origen, destino, ajustes, duracion, tamano, al_progresar=None):
+    """Codifica en dos pasadas con el bitrate que hace caber el resultado en
+    `tamano` bytes. La primera pasada solo analiza (sin audio ni salida);
+    el progreso de cada una cuenta como la mitad del total. Si aun asi se
+    pasa, se repite la segunda pasada con el bitrate reducido en proporcion.
+    Devuelve el bitrate de video usado"""
+    bitrate = bitrate_para_tamano(tamano, duracion, ajustes['audio_bitrate'])
+    registro = f"{destino}.pasadas"
+    mitad = int(duracion * 1_000_000 / 2)
+
+    def mitad_de(pasada):
+        def al_avanzar(datos):
+            if al_progresar is None:
+                return None
+            datos = dict(datos, out_time_us=str(_entero(datos.get("out_time_us")) // 2 + mitad * (pasada - 1)))
+            if pasada == 1:
+                datos["total_size"] = "0"
+            return al_progresar(datos)
+        return al_avanzar
+
+    def pasada(numero, bitrate):
+        video = argumentos_video(ajustes, bitrate=bitrate) + ["-pass", numero, "-passlogfile", registro]
+        if numero == 1:
+            return ["-v", "error", "-i", origen, *video, "-an", "-f", "null", os.devnull]
+        return [
+            "-v", "error", "-i", origen, *video,
+            "-c:a", "aac", "-b:a", ajustes['audio_bitrate'],
+            "-movflags", "+faststart", "-y", destino
+        ]
+
+    try:
+        await trabajadores.ffmpeg_progreso(pasada(1, bitrate), mitad_de(1))
+        await trabajadores.ffmpeg_progreso(pasada(2, bitrate), mitad_de(2))
+        resultado = os.path.getsize(destino)
+        if resultado > tamano:
+            bitrate = int(bitrate * tamano / resultado * (1 - MARGEN_CONTENEDOR))
+            print(f"Compresion a tamano: {resultado} > {tamano} bytes, repitiendo a {bitrate} bps")
+            await trabajadores.ffmpeg_progreso(pasada(2, bitrate), mitad_de(2))
+        return bitrate
+    finally:
+        for archivo in glob.glob(f"{glob.escape(registro)}*"):
+            os.remove(archivo)
+
+def _lista_concat(partes, ruta):
+    with open(ruta, "w") as lista:
+        for parte in partes:
+            lista.write("file '{}'\n".format(parte.replace("'", "'\\''")))
+    return ruta
+
+async def partir(origen, directorio, segmentos, duracion):
+    """Parte la pista de video en ~`segmentos` trozos sin recodificar.
+    Con copia de streams el muxer solo puede cortar en keyframes, asi que
+    cada trozo empieza en el primer keyframe tras su marca de tiempo"""
+    await trabajadores.ffmpeg([
+        "-v", "error", "-i", origen,
+        "-map", "0:v:0", "-an", "-sn", "-dn",
+        "-c", "copy",
+        "-f", "segment", "-segment_time", f"{duracion / segmentos:.3f}",
+        "-reset_timestamps", "1",
+        "-y", os.path.join(directorio, "parte_%04d.mkv")
+    ], pesado=False)
+    return sorted(glob.glob(os.path.join(directorio, "parte_*.mkv")))
+
+async def codificar_por_segmentos(origen, destino, ajustes, duracion, al_progresar=None, segmentos=None):
+    """Comprime `origen` en `destino` codificando los trozos a la vez.
+
+    El video se parte en keyframes, cada trozo se codifica en su propio
+    ffmpeg (limitados por el cupo de procesos pesados) y los resultados se
+    unen con el demuxer concat; el audio se codifica una sola vez del
+    original al unir, para que no haya saltos entre trozos. al_progresar
+    recibe el progreso agregado con las mismas claves que -progress.
+    Devuelve el numero de trozos, o None si el video no se pudo partir
+    (un solo keyframe, por ejemplo) y hay que usar el modo simple"""
+    segmentos = segmentos or COMPRESION_SEGMENTOS or trabajadores.cupo_pesados
+    directorio = f"{destino}.segmentos"
+    os.makedirs(directorio, exist_ok=True)
+    try:
+        partes = await partir(origen, directorio, max(2, segmentos), duracion)
+        if len(partes) < 2:
+            return None
+
+        hilos = max(1, _nucleos() // min(len(partes), trabajadores.cupo_pesados))
+        avance = [0] * len(partes)
+        tamanos = [0] * len(partes)
+        inicio = time.monotonic()
+
+        def seguimiento(indice):
+            async def al_avanzar(datos):
+                avance[indice] = _entero(datos.get("out_time_us"))
+                tamanos[indice] = _entero(datos.get("total_size"))
+                if al_progresar is None:
+                    return
+                hecho = sum(avance)
+                transcurrido = time.monotonic() - inicio
+                resultado = al_progresar({
+                    "out_time_us": str(hecho),
+                    "total_size": str(sum(tamanos)),
+                    "speed": f"{hecho / 1_000_000 / transcurrido:.2f}x" if transcurrido else "N/A",
+                    "progress": "continue"
+                })
+                if inspect.isawaitable(resultado):
+                    await resultado
+            return al_avanzar
+
+        codificadas = [f"{os.path.splitext(parte)[0]}_cod.mkv" for parte in partes]
+        tareas = [
+            asyncio.ensure_future(trabajadores.ffmpeg_progreso(
+                ["-v", "error", "-i", parte, *argumentos_video(ajustes, hilos), "-an", "-y", salida],
+                seguimiento(indice)
+            ))
+            for indice, (parte, salida) in enumerate(zip(partes, codificadas))
+        ]
+        try:
+            await asyncio.gather(*tareas)
+        except BaseException:
+            for tarea in tareas:
+                tarea.cancel()
+            await asyncio.gather(*tareas, return_exceptions=True)
+            raise
+
+        await trabajadores.ffmpeg([
+            "-v", "error",
+            "-f", "concat", "-safe", "0", "-i", _lista_concat(codificadas, os.path.join(directorio, "lista.txt")),
+            "-i", origen,
+            "-map", "0:v:0", "-map", "1:a:0?",
+            "-c:v", "copy",
+            "-c:a", "aac", "-b:a", ajustes['audio_bitrate'],
+            "-movflags", "+faststart",
+            "-y", destino
+        ])
+        return len(partes)
+    finally:
+        await asyncio.to_thread(shutil.rmtree, directorio, True)
+
+def huella_ajustes(ajustes, tamano=None):
+    """Hash estable de todo lo que cambia el resultado de -compress"""
+    datos = json.dumps({"ajustes": ajustes, "tamano": tamano}, sort_keys=True)
+    return hashlib.sha1(datos.encode("utf-8")).hexdigest()
+
+# Cache persistente de compresiones ya subidas: (file_unique_id del
+# original, huella de los ajustes) -> file_id del video comprimido y el
+# texto con sus estadisticas, para responder a una repeticion reenviando
+# el file_id sin descargar ni codificar nada.
+class CacheCompresiones:
+    def __init__(self, ruta=DB_PATH):
+        self.ruta = ruta
+        self._conn = None
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = conectar(self.ruta)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS compresiones (
+                    origen TEXT NOT NULL,
+                    huella TEXT NOT NULL,
+                    file_id TEXT NOT NULL,
+                    texto TEXT,
+                    tamano INTEGER,
+                    creado REAL NOT NULL,
+                    PRIMARY KEY (origen, huella)
+                ) WITHOUT ROWID
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS velocidades (
+                    huella TEXT PRIMARY KEY,
+                    velocidad REAL NOT NULL,
+                    creado REAL NOT NULL
+                ) WITHOUT ROWID
+            """)
+            self._conn.commit()
+        return self._conn
+
+    def buscar(self, origen, huella):
+        if not origen:
+            return None
+        return self.conn.execute(
+            "SELECT file_id, texto, tamano FROM compresiones WHERE origen = ? AND huella = ?",
+            (origen, huella)
+        ).fetchone()
+
+    def guardar(self, origen, huella, file_id, texto, tamano):
+        if not origen or not file_id:
+            return
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO compresiones (origen, huella, file_id, texto, tamano, creado) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (origen, huella, file_id, texto, tamano, time.time())
+            )
+
+    def olvidar(self, origen, huella):
+        with self.conn:
+            self.conn.execute("DELETE FROM compresiones WHERE origen = ? AND huella = ?", (origen, huella))
+
+    # Velocidad (segundos de video por segundo real) de la ultima
+    # compresion en un solo proceso con cada huella de ajustes; es la
+    # referencia con la que se compara el modo por segmentos
+    def velocidad(self, huella):
+        fila = self.conn.execute("SELECT velocidad FROM velocidades WHERE huella = ?", (huella,)).fetchone()
+        return fila[0] if fila else None
+
+    def registrar_velocidad(self, huella, duracion, segundos):
+        if not duracion or not segundos:
+            return
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO velocidades (huella, velocidad, creado) VALUES (?, ?, ?)",
+                (huella, duracion / segundos, time.time())
+            )
+
+    def aceleracion(self, huella, duracion, segundos):
+        """Cuantas veces mas rapido ha ido una compresion por segmentos que
+        la referencia de un proceso con los mismos ajustes (None sin referencia)"""
+        referencia = self.velocidad(huella)
+        if not referencia or not duracion or not segundos:
+            return None
+        return (duracion / segundos) / referencia
+
+cache_compresiones = CacheCompresiones()
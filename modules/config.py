@@ -8,3 +8,104 @@ LOG_CHANNEL = -1002688892136
 VERSION = '0.1.2'
 ENGINE = 'Wolf'
 SESSION_STRING = 'AQGht-EAXPq_s747HS-zRp_Yb-PnwKdZW011hbIp9XrpumM5wC5LNNiXMjGc3S4NqiVdo9pmpVnQhiPkjT8BAi9GOfrLiIN90N-ZRujal3Q_OWeJ8DKMQEfC4CtHwwnWRdfwTvyxNeppGTFTeWe1bglsGp_T0lx14rlKjHOI64xef7TJQ8l57Fj4W1r14R9_BVNlQ0dtxcJ3KEiIzqxGdaQHUA7wMCwVFDMR5efgtNHCXoDykHmDjEa_frNsBU6HYHYVl3IPjHbCnxGxMsgg-Ktq215lDIMz9oir0LPQB6RJWFlfMb41vhns1W_ADh9KIYMSxNpC_uYqaEvBc9T_ID6NnMEkyQAAAABn22vcAA'
+
+# Carpeta para datos persistentes (listado de frases, bases de datos)
+DATA_DIR = 'data'
+
+# Listado de frases a limpiar de captions y nombres de archivo
+LISTADO_URL = 'https://datafacil.vercel.app/listado.json'
+LISTADO_TTL = 600  # segundos entre refrescos en segundo plano
+LISTADO_ESPERA = 15  # segundos que espera el arranque a la primera descarga si no hay copia local
+LISTADO_REINTENTO = 30  # segundos entre intentos mientras no se haya cargado ningun listado
+
+# Mensajes que -urlsave descarga por delante del que se esta subiendo
+URLSAVE_EN_VUELO = 3
+
+# Lectura por lotes de rangos de mensajes (-urlsave / -save)
+PREFETCH_LOTE = 200  # ids por llamada a get_messages (maximo 200)
+PREFETCH_VENTANA = 2  # lotes pedidos por delante del trabajo actual
+
+# Copiar en el servidor (copy_message) cuando el origen no protege su contenido
+COPIA_DIRECTA = True
+
+# Limitador de tasa por clase de metodo: (mensajes/s inicial, mensajes/s maximo)
+LIMITES_TASA = {
+    "send": (1.0, 3.0),
+    "forward": (1.0, 3.0),
+    "get": (5.0, 20.0),
+    "edit": (0.5, 1.0),
+}
+
+# Diario de trabajos: se escribe cada N mensajes o cada N segundos
+TRABAJOS_COMMIT_CADA = 25
+TRABAJOS_COMMIT_SEGUNDOS = 10
+
+# Deduplicacion de lo ya entregado en cada destino: 'skip', 'resend' (por file_id) u 'off'
+DEDUP_MODO = 'skip'
+
+# Procesos de ffmpeg pesados (compresiones) a la vez; None = la mitad de los nucleos
+MEDIA_TRABAJADORES = None
+
+# -compress por segmentos: se parte el video en keyframes y se codifican los trozos a la vez
+COMPRESION_SEGMENTOS = None  # trozos; None = tantos como procesos pesados
+COMPRESION_PARALELA_MIN = 300  # segundos de video a partir de los que se usa por defecto
+# Bits por pixel y fotograma con los que se estima el bitrate de video objetivo de -compress;
+# si el original ya esta por debajo (y en resolucion, fps y codec) no se recodifica el video
+COMPRESION_BPP = 0.1
+# Lotes de -compress (album, rango de enlace o last=N)
+COMPRESION_LOTE_CODIFICADORES = 2  # videos codificandose a la vez
+COMPRESION_LOTE_EN_VUELO = 3  # videos descargados o codificandose por delante de la subida
+COMPRESION_LOTE_HISTORIAL = 1000  # mensajes que se revisan como maximo para last=N
+
+# Resultados de ffprobe que se conservan en memoria (LRU por ruta, tamano y mtime)
+SONDEO_CACHE = 256
+
+# Miniaturas de video: 'telegram' (la del mensaje original, ffmpeg si no hay), 'ffmpeg' u 'off'
+MINIATURA_MODO = 'telegram'
+
+# Session strings de cuentas extra que reparten las descargas con la principal.
+# Deben ser miembros de los chats de origen; los comandos solo llegan por la principal.
+SESIONES_EXTRA = []
+
+# Descargas por partes (upload.GetFile) para archivos grandes
+DESCARGA_PARALELA_MIN = 20 * 1024 * 1024  # bytes; por debajo se usa download_media
+DESCARGA_CONEXIONES = 4  # conexiones de media por DC
+DESCARGA_PARTES_EN_VUELO = 8  # partes de 1 MB pedidas a la vez
+
+# Subidas por partes (upload.SaveBigFilePart) para archivos grandes
+SUBIDA_PARALELA_MIN = 20 * 1024 * 1024  # bytes; nunca menos de 10 MB
+SUBIDA_CONEXIONES = 4  # conexiones de media al DC propio
+SUBIDA_PARTES_EN_VUELO = 8  # partes de 512 KB enviadas a la vez
+SUBIDA_REINTENTOS = 5  # intentos por parte
+
+# Espacio de trabajo para descargas temporales
+DESCARGAS_DIR = 'downloads'
+ESPACIO_CUOTA = None  # bytes maximos en DESCARGAS_DIR; None = solo el espacio libre del disco
+ESPACIO_GRACIA = 3600  # segundos sin uso tras los que un archivo huerfano se puede desalojar
+ESPACIO_TMPFS = None  # p. ej. '/dev/shm/userbot' para guardar alli la media pequena
+ESPACIO_TMPFS_MAX = 50 * 1024 * 1024  # tamano maximo de archivo que va a tmpfs
+
+# Telemetria de transferencias
+PROGRESO_INTERVALO = 5  # segundos minimos entre ediciones del mensaje de progreso
+TELEMETRIA_HISTORIAL = 50  # transferencias terminadas que recuerda -transfers
+
+# Planificador de comandos pesados: tareas simultaneas por tipo (None = mitad de los nucleos)
+PLANIFICADOR_LIMITES = {
+    "encode": None,
+    "stream": 1,
+    "mirror": 2,
+    "music": 1,
+    "ia": 3,
+}
+# Prioridad por tipo: menor numero = se lanza antes
+PLANIFICADOR_PRIORIDADES = {
+    "ia": 0,
+    "encode": 1,
+    "stream": 1,
+    "music": 2,
+    "mirror": 3,
+}
+PLANIFICADOR_TOTAL = 4  # tareas pesadas a la vez entre todos los tipos
+
+# Ids por llamada a forward_messages en -save (maximo 100)
+FORWARD_LOTE = 100
@@ -0,0 +1,15 @@
+import os
+import sqlite3
+
+from modules.config import DATA_DIR
+
+DB_PATH = os.path.join(DATA_DIR, "userbot.db")
+
+def conectar(ruta=DB_PATH):
+    """Abre la base SQLite compartida por los modulos con datos persistentes"""
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    conn = sqlite3.connect(ruta, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
@@ -0,0 +1,164 @@
+import asyncio
+import inspect
+import mimetypes
+import os
+
+from pyrogram import raw
+from pyrogram.errors import AuthBytesInvalid, FileReferenceExpired
+from pyrogram.file_id import FileId, FileType
+from pyrogram.session import Auth, Session
+
+from modules.config import DESCARGA_CONEXIONES, DESCARGA_PARTES_EN_VUELO, DESCARGA_PARALELA_MIN
+from modules.indice import media_de
+from modules.telemetria import dc_actual
+
+# Tamano de cada parte pedida con upload.GetFile (maximo que acepta Telegram)
+PARTE = 1024 * 1024
+
+class DescargaNoParalela(Exception):
+    """El archivo no se puede bajar por partes (CDN, referencia caducada...)"""
+
+# Descargador por partes. Abre DESCARGA_CONEXIONES sesiones de media contra
+# el DC del archivo (compartiendo una sola clave autorizada) y pide
+# DESCARGA_PARTES_EN_VUELO partes de 1 MB a la vez, escribiendo cada una en
+# su desplazamiento dentro de un archivo reservado con el tamano final.
+# Los archivos pequenos, las fotos y los casos que no admite (redireccion
+# a CDN, file_reference caducado) se delegan en client.download_media.
+class DescargadorParalelo:
+    def __init__(self, conexiones=DESCARGA_CONEXIONES, en_vuelo=DESCARGA_PARTES_EN_VUELO, minimo=DESCARGA_PARALELA_MIN):
+        self.conexiones = max(1, conexiones)
+        self.en_vuelo = max(1, en_vuelo)
+        self.minimo = minimo
+        self.sesiones = {}
+        self._locks = {}
+
+    async def _crear_sesiones(self, client, dc_id):
+        test_mode = await client.storage.test_mode()
+        if dc_id == await client.storage.dc_id():
+            auth_key = await client.storage.auth_key()
+            exportar = False
+        else:
+            auth_key = await Auth(client, dc_id, test_mode).create()
+            exportar = True
+
+        sesiones = []
+        for numero in range(self.conexiones):
+            sesion = Session(client, dc_id, auth_key, test_mode, is_media=True)
+            await sesion.start()
+            # La autorizacion va ligada a la clave, basta con importarla una vez
+            if exportar and numero == 0:
+                for _ in range(3):
+                    exportada = await client.invoke(raw.functions.auth.ExportAuthorization(dc_id=dc_id))
+                    try:
+                        await sesion.invoke(raw.functions.auth.ImportAuthorization(
+                            id=exportada.id, bytes=exportada.bytes
+                        ))
+                    except AuthBytesInvalid:
+                        continue
+                    break
+            sesiones.append(sesion)
+        return sesiones
+
+    async def _sesiones(self, client, dc_id):
+        clave = (id(client), dc_id)
+        lock = self._locks.setdefault(clave, asyncio.Lock())
+        async with lock:
+            if clave not in self.sesiones:
+                self.sesiones[clave] = await self._crear_sesiones(client, dc_id)
+        return self.sesiones[clave]
+
+    def _ruta_destino(self, client, msg, media, file_name):
+        directorio, nombre = os.path.split(file_name or "downloads/")
+        if not os.path.isabs(directorio):
+            directorio = os.path.join(str(getattr(client, "PARENT_DIR", "")), directorio or "downloads")
+        if not nombre:
+            nombre = getattr(media, "file_name", None)
+        if not nombre:
+            extension = mimetypes.guess_extension(getattr(media, "mime_type", None) or "") or ""
+            nombre = f"{msg.media.value}_{msg.chat.id}_{msg.id}{extension}"
+        os.makedirs(directorio, exist_ok=True)
+        return os.path.abspath(os.path.join(directorio, nombre))
+
+    async def _parte(self, sesion, location, indice):
+        respuesta = await sesion.invoke(
+            raw.functions.upload.GetFile(location=location, offset=indice * PARTE, limit=PARTE),
+            sleep_threshold=30
+        )
+        if not isinstance(respuesta, raw.types.upload.File):
+            raise DescargaNoParalela("el archivo se sirve desde un CDN")
+        return respuesta.bytes
+
+    async def _bajar(self, client, file_id, tamano, ruta, progress, progress_args):
+        location = raw.types.InputDocumentFileLocation(
+            id=file_id.media_id,
+            access_hash=file_id.access_hash,
+            file_reference=file_id.file_reference,
+            thumb_size=file_id.thumbnail_size
+        )
+        sesiones = await self._sesiones(client, file_id.dc_id)
+        token = dc_actual.set(file_id.dc_id)
+        partes = asyncio.Queue()
+        for indice in range((tamano + PARTE - 1) // PARTE):
+            partes.put_nowait(indice)
+        bajado = 0
+
+        with open(ruta, "wb") as archivo:
+            archivo.truncate(tamano)
+            fd = archivo.fileno()
+
+            async def trabajador(numero):
+                nonlocal bajado
+                sesion = sesiones[numero % len(sesiones)]
+                while not partes.empty():
+                    indice = partes.get_nowait()
+                    datos = await self._parte(sesion, location, indice)
+                    await asyncio.to_thread(os.pwrite, fd, datos, indice * PARTE)
+                    bajado += len(datos)
+                    if progress:
+                        resultado = progress(min(bajado, tamano), tamano, *progress_args)
+                        if inspect.isawaitable(resultado):
+                            await resultado
+
+            trabajadores = [asyncio.ensure_future(trabajador(n)) for n in range(self.en_vuelo)]
+            dc_actual.reset(token)
+            try:
+                await asyncio.gather(*trabajadores)
+            except BaseException:
+                for tarea in trabajadores:
+                    tarea.cancel()
+                await asyncio.gather(*trabajadores, return_exceptions=True)
+                raise
+
+    async def descargar(self, client, msg, file_name=None, progress=None, progress_args=()):
+        """Sustituto de client.download_media(msg, ...) que baja por partes en paralelo"""
+        def normal():
+            return client.download_media(
+                msg, file_name=file_name or "downloads/", progress=progress, progress_args=progress_args
+            )
+
+        media = media_de(msg)
+        tamano = getattr(media, "file_size", 0) or 0
+        if media is None or msg.photo or tamano < self.minimo:
+            return await normal()
+
+        file_id = FileId.decode(media.file_id)
+        if file_id.file_type in (FileType.PHOTO, FileType.CHAT_PHOTO, FileType.THUMBNAIL):
+            return await normal()
+
+        ruta = self._ruta_destino(client, msg, media, file_name)
+        temporal = f"{ruta}.temp"
+        try:
+            await self._bajar(client, file_id, tamano, temporal, progress, progress_args)
+        except (DescargaNoParalela, FileReferenceExpired) as ex:
+            print(f"Descarga por partes no disponible ({ex}), se usa la descarga normal")
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            return await normal()
+        except BaseException:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+        os.replace(temporal, ruta)
+        return ruta
+
+descargador = DescargadorParalelo()
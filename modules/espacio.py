@@ -0,0 +1,208 @@
+import asyncio
+import os
+import shutil
+import time
+from contextlib import asynccontextmanager
+
+from modules.config import DESCARGAS_DIR, ESPACIO_CUOTA, ESPACIO_GRACIA, ESPACIO_TMPFS, ESPACIO_TMPFS_MAX
+
+# Margen libre que se deja siempre en el disco para no llegar a ENOSPC
+MARGEN_DISCO = 200 * 1024 * 1024
+
+# Las descargas en curso se escriben en "<archivo>.temp" (tanto el
+# descargador por partes como download_media) y se renombran al acabar
+SUFIJO_EN_CURSO = ".temp"
+
+def _ocupado(estado):
+    # Bytes realmente escritos: las descargas por partes reservan el
+    # archivo con truncate, que no ocupa disco hasta que se escribe
+    bloques = getattr(estado, "st_blocks", None)
+    if bloques is None:
+        return estado.st_size
+    return min(estado.st_size, bloques * 512)
+
+def _archivos(ruta):
+    if os.path.isfile(ruta):
+        yield ruta
+        return
+    for raiz, _, archivos in os.walk(ruta):
+        for archivo in archivos:
+            yield os.path.join(raiz, archivo)
+
+def _recorrer(ruta):
+    """(bytes ocupados, bytes escritos de descargas en curso) bajo `ruta`"""
+    total, en_curso = 0, 0
+    limite = time.time() - ESPACIO_GRACIA
+    for ruta_archivo in _archivos(ruta):
+        try:
+            estado = os.stat(ruta_archivo)
+        except OSError:
+            continue
+        ocupado = _ocupado(estado)
+        total += ocupado
+        # Un .temp que lleva mas de la gracia sin escribirse es un resto huerfano
+        if ruta_archivo.endswith(SUFIJO_EN_CURSO) and estado.st_mtime >= limite:
+            en_curso += ocupado
+    return total, en_curso
+
+def _tamano(ruta):
+    return _recorrer(ruta)[0]
+
+def _ultimo_uso(ruta):
+    estado = os.stat(ruta)
+    return max(estado.st_atime, estado.st_mtime)
+
+# Carpeta temporal de un trabajo. Todo lo que descarga el trabajo va aqui
+# (o a su gemela en tmpfs si es pequeno) y se borra entera al cerrarla.
+class Carpeta:
+    def __init__(self, espacio, nombre):
+        self.espacio = espacio
+        self.nombre = nombre
+        self.ruta = os.path.join(espacio.raiz, nombre)
+        self.ruta_rapida = os.path.join(espacio.tmpfs, nombre) if espacio.tmpfs else None
+        os.makedirs(self.ruta, exist_ok=True)
+
+    def destino(self, tamano=0):
+        """Directorio (terminado en separador) donde descargar un archivo de `tamano` bytes"""
+        if self.ruta_rapida and 0 < tamano <= ESPACIO_TMPFS_MAX:
+            try:
+                os.makedirs(self.ruta_rapida, exist_ok=True)
+                if shutil.disk_usage(self.ruta_rapida).free > tamano * 2:
+                    return self.ruta_rapida + os.sep
+            except OSError:
+                pass
+        return self.ruta + os.sep
+
+    def reserva(self, tamano):
+        return self.espacio.reserva(tamano)
+
+    def borrar(self):
+        for ruta in (self.ruta, self.ruta_rapida):
+            if ruta and os.path.exists(ruta):
+                shutil.rmtree(ruta, ignore_errors=True)
+
+# Gestor del directorio de descargas.
+# - Cada trabajo abre su propia carpeta y la borra al terminar.
+# - Antes de descargar se reserva el tamano del archivo: si se pasaria de
+#   ESPACIO_CUOTA (o del espacio libre del disco) primero se desalojan los
+#   archivos huerfanos menos usados y, si no basta, se espera a que otros
+#   trabajos liberen espacio en lugar de fallar con ENOSPC.
+# - Huerfano es todo lo que no pertenece a una carpeta abierta y lleva mas
+#   de ESPACIO_GRACIA segundos sin tocarse.
+class EspacioTrabajo:
+    def __init__(self, raiz=DESCARGAS_DIR, cuota=ESPACIO_CUOTA, tmpfs=ESPACIO_TMPFS):
+        self.raiz = os.path.abspath(raiz)
+        self.cuota = cuota
+        self.tmpfs = tmpfs
+        self.carpetas = {}
+        self.reservado = 0
+        self._cambio = asyncio.Condition()
+        os.makedirs(self.raiz, exist_ok=True)
+
+    def abrir(self, nombre):
+        if nombre not in self.carpetas:
+            self.carpetas[nombre] = Carpeta(self, nombre)
+        return self.carpetas[nombre]
+
+    async def cerrar(self, carpeta):
+        self.carpetas.pop(carpeta.nombre, None)
+        await asyncio.to_thread(carpeta.borrar)
+        async with self._cambio:
+            self._cambio.notify_all()
+
+    @asynccontextmanager
+    async def carpeta(self, nombre):
+        carpeta = self.abrir(nombre)
+        try:
+            yield carpeta
+        finally:
+            await self.cerrar(carpeta)
+
+    def uso(self):
+        return _tamano(self.raiz)
+
+    def huerfanos(self, gracia=ESPACIO_GRACIA):
+        """Entradas del directorio de descargas sin carpeta abierta, de la menos usada a la mas"""
+        ahora = time.time()
+        entradas = []
+        for nombre in os.listdir(self.raiz):
+            if nombre in self.carpetas:
+                continue
+            ruta = os.path.join(self.raiz, nombre)
+            try:
+                ultimo = _ultimo_uso(ruta)
+            except OSError:
+                continue
+            if ahora - ultimo >= gracia:
+                entradas.append((ultimo, ruta))
+        return [ruta for _, ruta in sorted(entradas)]
+
+    def _eliminar(self, ruta):
+        tamano = _tamano(ruta)
+        if os.path.isdir(ruta):
+            shutil.rmtree(ruta, ignore_errors=True)
+        else:
+            os.remove(ruta)
+        return tamano
+
+    def desalojar(self, necesarios):
+        """Borra huerfanos (LRU) hasta liberar `necesarios` bytes. Devuelve lo liberado"""
+        liberado = 0
+        for ruta in self.huerfanos():
+            if liberado >= necesarios:
+                break
+            try:
+                liberado += self._eliminar(ruta)
+            except OSError as ex:
+                print(f"No se pudo desalojar {ruta}: {ex}")
+        return liberado
+
+    def limpiar(self):
+        """Borra todos los huerfanos sin esperar la gracia. Devuelve (entradas, bytes)"""
+        entradas, liberado = 0, 0
+        for ruta in self.huerfanos(gracia=0):
+            try:
+                liberado += self._eliminar(ruta)
+                entradas += 1
+            except OSError as ex:
+                print(f"No se pudo borrar {ruta}: {ex}")
+        return entradas, liberado
+
+    def _falta(self, tamano):
+        """Bytes que faltan para poder reservar `tamano` (0 si cabe).
+        Lo ya escrito de las descargas en curso cuenta en el uso y en el
+        espacio libre del disco, asi que de lo reservado solo se suma lo
+        que aun falta por escribir"""
+        uso, en_curso = _recorrer(self.raiz)
+        pendiente = max(0, self.reservado - en_curso)
+        falta = 0
+        if self.cuota:
+            falta = uso + pendiente + tamano - self.cuota
+        libre = shutil.disk_usage(self.raiz).free - pendiente - MARGEN_DISCO
+        return max(falta, tamano - libre, 0)
+
+    @asynccontextmanager
+    async def reserva(self, tamano):
+        """Reserva espacio para una descarga mientras dura el bloque"""
+        tamano = tamano or 0
+        async with self._cambio:
+            while True:
+                falta = await asyncio.to_thread(self._falta, tamano)
+                if falta > 0:
+                    falta -= await asyncio.to_thread(self.desalojar, falta)
+                # Si no hay nada mas en curso no tiene sentido esperar
+                if falta <= 0 or (not self.reservado and len(self.carpetas) <= 1):
+                    break
+                try:
+                    await asyncio.wait_for(self._cambio.wait(), 5)
+                except asyncio.TimeoutError:
+                    pass
+            self.reservado += tamano
+        try:
+            yield
+        finally:
+            async with self._cambio:
+                self.reservado -= tamano
+                self._cambio.notify_all()
+
+espacio = EspacioTrabajo()
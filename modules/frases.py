@@ -0,0 +1,137 @@
+import asyncio
+import json
+import os
+import time
+import aiohttp
+
+from modules.limpieza import compilar_patron
+from modules.config import LISTADO_URL, LISTADO_TTL, LISTADO_ESPERA, LISTADO_REINTENTO, DATA_DIR
+
+# Copia local del listado para arrancar sin red
+LISTADO_CACHE = os.path.join(DATA_DIR, "listado.json")
+
+# Listado de frases a eliminar de captions y nombres de archivo.
+# Se carga una sola vez desde disco y se refresca en segundo plano,
+# asi limpiar un caption nunca hace una peticion HTTP.
+class ListadoFrases:
+    def __init__(self, url=LISTADO_URL, ruta=LISTADO_CACHE, ttl=LISTADO_TTL):
+        self.url = url
+        self.ruta = ruta
+        self.ttl = ttl
+        self.frases = []
+        self._patron = None
+        self._patron_frases = None
+        self.etag = None
+        self.last_modified = None
+        self.actualizado = 0
+        self._tarea = None
+        # Se marca en cuanto hay un listado utilizable y compilado (copia local o descarga)
+        self.cargado = asyncio.Event()
+        self._cargar_local()
+
+    def _cargar_local(self):
+        try:
+            with open(self.ruta, "r", encoding="utf-8") as f:
+                datos = json.load(f)
+            self.frases = datos.get("frases", [])
+            self.etag = datos.get("etag")
+            self.last_modified = datos.get("last_modified")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error leyendo copia local del listado: {e}")
+
+    def _guardar_local(self):
+        os.makedirs(os.path.dirname(self.ruta), exist_ok=True)
+        temporal = f"{self.ruta}.tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump({
+                "frases": self.frases,
+                "etag": self.etag,
+                "last_modified": self.last_modified
+            }, f, ensure_ascii=False)
+        os.replace(temporal, self.ruta)
+
+    # Peticion condicional: si el servidor responde 304 no se descarga nada
+    async def actualizar(self):
+        headers = {}
+        if self.frases and self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.frases and self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        try:
+            timeout = aiohttp.ClientTimeout(total=30)
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                async with session.get(self.url, headers=headers) as response:
+                    if response.status == 304:
+                        self.actualizado = time.time()
+                        self.cargado.set()
+                        return False
+                    response.raise_for_status()
+                    frases = await response.json(content_type=None)
+                    if not isinstance(frases, list):
+                        raise ValueError("El listado no es una lista de frases")
+                    frases = [f for f in frases if isinstance(f, str) and f]
+                    self._patron = await asyncio.to_thread(compilar_patron, frases)
+                    self._patron_frases = self.frases = frases
+                    self.etag = response.headers.get("ETag")
+                    self.last_modified = response.headers.get("Last-Modified")
+                    self.actualizado = time.time()
+                    self.cargado.set()
+            await asyncio.to_thread(self._guardar_local)
+            return True
+        except Exception as e:
+            print(f"Error actualizando listado de frases: {e}")
+            return False
+
+    # La copia local se compila fuera del bucle de eventos antes de darla por cargada
+    async def _precompilar(self):
+        frases = self.frases
+        if not frases:
+            return
+        if frases is not self._patron_frases:
+            patron = await asyncio.to_thread(compilar_patron, frases)
+            if self.frases is frases:
+                self._patron = patron
+                self._patron_frases = frases
+        self.cargado.set()
+
+    async def _bucle(self):
+        await self._precompilar()
+        while True:
+            await self.actualizar()
+            # Sin ningun listado cargado se reintenta pronto en vez de esperar el TTL
+            await asyncio.sleep(self.ttl if self.cargado.is_set() else min(self.ttl, LISTADO_REINTENTO))
+
+    def iniciar(self):
+        if self._tarea is None or self._tarea.done():
+            self._tarea = asyncio.get_running_loop().create_task(self._bucle())
+
+    async def esperar(self, espera=LISTADO_ESPERA):
+        """Espera (como mucho `espera` segundos) a tener un listado cargado.
+        Devuelve False si se agota el tiempo y se sigue sin listado"""
+        self.iniciar()
+        try:
+            await asyncio.wait_for(self.cargado.wait(), espera)
+            return True
+        except asyncio.TimeoutError:
+            print("El listado de frases aun no esta disponible; se sigue sin limpiar")
+            return False
+
+    def obtener(self):
+        if self._tarea is None:
+            try:
+                self.iniciar()
+            except RuntimeError:
+                pass
+        return self.frases
+
+    # El patron solo se recompila cuando cambia el listado
+    def patron(self):
+        frases = self.obtener()
+        if frases is not self._patron_frases:
+            self._patron = compilar_patron(frases)
+            self._patron_frases = frases
+        return self._patron
+
+listado = ListadoFrases()
@@ -0,0 +1,88 @@
+import hashlib
+import time
+
+from modules.db import DB_PATH, conectar
+
+# Modos de deduplicacion
+OMITIR = "skip"
+REENVIAR = "resend"
+DESACTIVADO = "off"
+
+def media_de(msg):
+    """Devuelve el objeto de media (Photo, Video, Document...) de un mensaje"""
+    if not msg or not msg.media:
+        return None
+    return getattr(msg, msg.media.value, None)
+
+def tipo_de(msg):
+    """Tipo de media segun determine_media_type: video, photo o document"""
+    if msg.video:
+        return "video"
+    if msg.photo:
+        return "photo"
+    return "document"
+
+def clave_mensaje(msg, texto=None):
+    """Clave de deduplicacion: file_unique_id para media, hash para texto"""
+    media = media_de(msg)
+    if media is not None and getattr(media, "file_unique_id", None):
+        return f"f:{media.file_unique_id}"
+    if msg.media:
+        return None
+    texto = texto if texto is not None else (msg.text or msg.caption)
+    if not texto:
+        return None
+    return "t:" + hashlib.sha1(str(texto).encode("utf-8")).hexdigest()
+
+# Indice persistente de lo que ya se entrego en cada destino
+class IndiceEntregas:
+    def __init__(self, ruta=DB_PATH):
+        self.ruta = ruta
+        self._conn = None
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = conectar(self.ruta)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS entregas (
+                    destino TEXT NOT NULL,
+                    clave TEXT NOT NULL,
+                    file_id TEXT,
+                    tipo TEXT,
+                    message_id INTEGER,
+                    creado REAL NOT NULL,
+                    PRIMARY KEY (destino, clave)
+                ) WITHOUT ROWID
+            """)
+            self._conn.commit()
+        return self._conn
+
+    def buscar(self, destino, clave):
+        if not clave:
+            return None
+        return self.conn.execute(
+            "SELECT file_id, tipo, message_id FROM entregas WHERE destino = ? AND clave = ?",
+            (str(destino), clave)
+        ).fetchone()
+
+    def registrar(self, destino, clave, enviado=None):
+        """Guarda la entrega de `clave` en `destino` con el mensaje resultante"""
+        if not clave:
+            return
+        media = media_de(enviado)
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entregas (destino, clave, file_id, tipo, message_id, creado) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    str(destino),
+                    clave,
+                    getattr(media, "file_id", None),
+                    tipo_de(enviado) if media is not None else None,
+                    enviado.id if enviado else None,
+                    time.time()
+                )
+            )
+
+indice = IndiceEntregas()
@@ -0,0 +1,98 @@
+import asyncio
+import time
+from pyrogram.errors import FloodWait
+
+from modules.config import LIMITES_TASA
+from modules.subidas import subidos
+
+# Cubeta de tokens con tasa adaptativa.
+# Cada FloodWait bloquea la cubeta el tiempo indicado por Telegram y reduce
+# la tasa a la mitad; cada racha de exitos la vuelve a subir poco a poco
+# hasta la tasa maxima configurada.
+class Cubeta:
+    def __init__(self, tasa, maxima, minima=0.05, rafaga=3, racha=20):
+        self.tasa = tasa
+        self.maxima = maxima
+        self.minima = minima
+        self.capacidad = rafaga
+        self.racha = racha
+        self.tokens = rafaga
+        self.ultimo = time.monotonic()
+        self.bloqueado_hasta = 0
+        self.exitos = 0
+        self.floods = 0
+        self._lock = asyncio.Lock()
+
+    def _recargar(self, ahora):
+        self.tokens = min(self.capacidad, self.tokens + (ahora - self.ultimo) * self.tasa)
+        self.ultimo = ahora
+
+    async def adquirir(self):
+        async with self._lock:
+            while True:
+                ahora = time.monotonic()
+                if ahora < self.bloqueado_hasta:
+                    await asyncio.sleep(self.bloqueado_hasta - ahora)
+                    continue
+                self._recargar(ahora)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.tasa)
+
+    def exito(self):
+        self.exitos += 1
+        if self.exitos >= self.racha and self.tasa < self.maxima:
+            self.tasa = min(self.maxima, self.tasa + self.maxima * 0.1)
+            self.exitos = 0
+
+    def flood(self, segundos):
+        self.floods += 1
+        self.exitos = 0
+        self.tokens = 0
+        self.tasa = max(self.minima, self.tasa / 2)
+        self.bloqueado_hasta = max(self.bloqueado_hasta, time.monotonic() + segundos)
+
+# Limitador compartido por todos los handlers, con una cubeta por clase
+# de metodo: send, forward, get y edit.
+class Limitador:
+    def __init__(self, limites=LIMITES_TASA):
+        self.cubetas = {
+            clase: Cubeta(tasa=tasa, maxima=maxima)
+            for clase, (tasa, maxima) in limites.items()
+        }
+
+    def cubeta(self, clase):
+        if clase not in self.cubetas:
+            tasa, maxima = LIMITES_TASA["send"]
+            self.cubetas[clase] = Cubeta(tasa=tasa, maxima=maxima)
+        return self.cubetas[clase]
+
+    async def ejecutar(self, clase, funcion, *args, intentos=5, **kwargs):
+        cubeta = self.cubeta(clase)
+        # Los archivos que suba `funcion` se recuerdan entre intentos para
+        # que un FloodWait en el envio final no repita la subida entera
+        token = subidos.set({})
+        try:
+            for intento in range(intentos):
+                await cubeta.adquirir()
+                try:
+                    resultado = await funcion(*args, **kwargs)
+                except FloodWait as e:
+                    cubeta.flood(e.value)
+                    print(f"FloodWait de {e.value}s en '{clase}', tasa reducida a {cubeta.tasa:.2f}/s")
+                    if intento == intentos - 1:
+                        raise
+                    continue
+                cubeta.exito()
+                return resultado
+        finally:
+            subidos.reset(token)
+
+    def estado(self):
+        return {
+            clase: {"tasa": cubeta.tasa, "floods": cubeta.floods}
+            for clase, cubeta in self.cubetas.items()
+        }
+
+limitador = Limitador()
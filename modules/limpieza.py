@@ -0,0 +1,74 @@
+import re
+
+SALTOS_EXTRA = re.compile(r"\n{3,}")
+ESPACIOS_EXTRA = re.compile(r" {2,}")
+
+# Limite de grupos anidados del patron en trie; por encima se usa una
+# alternancia plana, que el compilador de re no recorre recursivamente.
+PROFUNDIDAD_MAXIMA = 100
+
+# Construye un regex con forma de trie a partir de las frases.
+# Las frases que comparten prefijo comparten tambien el camino del regex,
+# por lo que cada posicion del texto se prueba una sola vez por caracter
+# en lugar de una vez por frase. Se recorre con una pila explicita para
+# que las frases largas no agoten el limite de recursion.
+def _regex_trie(trie):
+    """Devuelve (regex, grupos anidados) del trie"""
+    resultados = {}
+    pila = [(trie, False)]
+    while pila:
+        nodo, listo = pila.pop()
+        hijos = [(car, hijo) for car, hijo in sorted(nodo.items()) if car]
+        if not listo:
+            pila.append((nodo, True))
+            pila.extend((hijo, False) for _, hijo in hijos)
+            continue
+        ramas = []
+        profundidad = 0
+        for car, hijo in hijos:
+            cuerpo, nivel = resultados.pop(id(hijo))
+            ramas.append(re.escape(car) + cuerpo)
+            profundidad = max(profundidad, nivel)
+        if not ramas:
+            resultados[id(nodo)] = ("", 0)
+            continue
+        if len(ramas) == 1:
+            cuerpo = ramas[0]
+        else:
+            cuerpo = "(?:" + "|".join(ramas) + ")"
+            profundidad += 1
+        if "" in nodo:
+            cuerpo = f"(?:{cuerpo})?"
+            profundidad += 1
+        resultados[id(nodo)] = (cuerpo, profundidad)
+    return resultados[id(trie)]
+
+def compilar_patron(frases):
+    """Compila todas las frases en un unico patron (None si no hay frases)"""
+    frases = [frase for frase in frases if frase]
+    if not frases:
+        return None
+    trie = {}
+    for frase in frases:
+        nodo = trie
+        for car in frase:
+            nodo = nodo.setdefault(car, {})
+        nodo[""] = True
+    cuerpo, profundidad = _regex_trie(trie)
+    if profundidad > PROFUNDIDAD_MAXIMA:
+        cuerpo = "|".join(map(re.escape, sorted(set(frases), key=len, reverse=True)))
+    return re.compile(cuerpo)
+
+def limpiar_texto(texto, patron):
+    """Elimina las frases del texto y colapsa las lineas en blanco sobrantes"""
+    if not texto:
+        return texto
+    if patron is not None:
+        texto = patron.sub("", texto)
+    return SALTOS_EXTRA.sub("\n\n", texto).strip()
+
+def limpiar_nombre(nombre, patron):
+    """Elimina las frases de un nombre de archivo y colapsa los espacios"""
+    if patron is not None:
+        nombre = patron.sub("", nombre)
+    return ESPACIOS_EXTRA.sub(" ", nombre).strip()
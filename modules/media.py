@@ -0,0 +1,235 @@
+import asyncio
+import inspect
+import json
+import os
+from collections import OrderedDict
+
+from modules.config import MEDIA_TRABAJADORES, SONDEO_CACHE
+
+class ErrorMedia(Exception):
+    def __init__(self, programa, codigo, errores=b""):
+        self.programa = programa
+        self.codigo = codigo
+        self.stderr = errores
+        detalle = errores.decode(errors="replace").strip().splitlines()
+        super().__init__(f"{programa} termino con codigo {codigo}: {detalle[-1] if detalle else 'sin salida'}")
+
+def _nucleos():
+    return os.cpu_count() or 1
+
+# Capa de trabajadores para ffmpeg/ffprobe.
+# Todos los procesos se lanzan como subprocesos asincronos, asi que el bucle
+# de eventos nunca se bloquea. Las codificaciones (pesadas) se limitan a
+# MEDIA_TRABAJADORES procesos a la vez (por defecto la mitad de los nucleos);
+# los sondeos y miniaturas tienen su propio cupo mas amplio para no quedarse
+# esperando detras de una compresion larga.
+class TrabajadoresMedia:
+    def __init__(self, pesados=MEDIA_TRABAJADORES):
+        self.cupo_pesados = pesados or max(1, _nucleos() // 2)
+        self.pesados = asyncio.Semaphore(self.cupo_pesados)
+        self.ligeros = asyncio.Semaphore(max(2, _nucleos()))
+        self.procesos = set()
+
+    def _argumentos(self, programa, args):
+        # Acepta tanto listas de argumentos como streams de ffmpeg-python
+        if hasattr(args, "compile"):
+            args = args.compile(cmd=programa)
+        else:
+            args = [programa, *args]
+        return [str(a) for a in args]
+
+    async def _lanzar(self, args, stdout=asyncio.subprocess.PIPE):
+        proceso = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=stdout,
+            stderr=asyncio.subprocess.PIPE
+        )
+        self.procesos.add(proceso)
+        return proceso
+
+    async def _ejecutar(self, args, cupo):
+        async with cupo:
+            proceso = await self._lanzar(args)
+            try:
+                salida, errores = await proceso.communicate()
+            except asyncio.CancelledError:
+                # Si se cancela la tarea no se deja el ffmpeg huerfano
+                if proceso.returncode is None:
+                    proceso.kill()
+                    await proceso.wait()
+                raise
+            finally:
+                self.procesos.discard(proceso)
+        if proceso.returncode != 0:
+            raise ErrorMedia(args[0], proceso.returncode, errores)
+        return salida, errores
+
+    async def ffmpeg(self, args, pesado=True):
+        """Ejecuta ffmpeg y espera a que termine. Devuelve (stdout, stderr)"""
+        return await self._ejecutar(
+            self._argumentos("ffmpeg", args),
+            self.pesados if pesado else self.ligeros
+        )
+
+    async def ffmpeg_progreso(self, args, al_progresar, pesado=True):
+        """Ejecuta ffmpeg con -progress pipe:1 y llama a al_progresar(datos)
+        con cada bloque de progreso (out_time_us, total_size, speed...).
+        Si se cancela la tarea, ffmpeg se detiene y se espera a que salga"""
+        args = self._argumentos("ffmpeg", args)
+        args[1:1] = ["-progress", "pipe:1", "-nostats"]
+        async with self.pesados if pesado else self.ligeros:
+            proceso = await self._lanzar(args)
+            # stderr se vacia en paralelo para que ffmpeg no se bloquee escribiendo
+            errores = asyncio.ensure_future(proceso.stderr.read())
+            try:
+                datos = {}
+                async for linea in proceso.stdout:
+                    clave, _, valor = linea.decode(errors="replace").strip().partition("=")
+                    datos[clave] = valor
+                    if clave == "progress":
+                        resultado = al_progresar(dict(datos))
+                        if inspect.isawaitable(resultado):
+                            await resultado
+                await proceso.wait()
+            except asyncio.CancelledError:
+                errores.cancel()
+                await self.terminar(proceso)
+                raise
+            finally:
+                self.procesos.discard(proceso)
+        salida_errores = await errores
+        if proceso.returncode != 0:
+            raise ErrorMedia(args[0], proceso.returncode, salida_errores)
+
+    async def ffprobe(self, ruta, *opciones):
+        """Ejecuta ffprobe sobre `ruta` y devuelve su salida JSON"""
+        args = self._argumentos("ffprobe", [*opciones, "-of", "json", ruta])
+        salida, _ = await self._ejecutar(args, self.ligeros)
+        return json.loads(salida or b"{}")
+
+    async def iniciar(self, args):
+        """Lanza ffmpeg sin esperar ni ocupar cupo (transmisiones indefinidas)"""
+        return await self._lanzar(self._argumentos("ffmpeg", args), stdout=asyncio.subprocess.DEVNULL)
+
+    async def terminar(self, proceso, espera=5):
+        """Detiene un proceso lanzado con iniciar()"""
+        if proceso.returncode is None:
+            proceso.terminate()
+            try:
+                await asyncio.wait_for(proceso.wait(), espera)
+            except asyncio.TimeoutError:
+                proceso.kill()
+                await proceso.wait()
+        self.procesos.discard(proceso)
+
+trabajadores = TrabajadoresMedia()
+
+def _fraccion(valor):
+    """Convierte '30000/1001' o '25' en float"""
+    try:
+        if "/" in str(valor):
+            num, den = str(valor).split("/", 1)
+            return float(num) / float(den) if float(den) else 0.0
+        return float(valor)
+    except (TypeError, ValueError):
+        return 0.0
+
+def _entero(valor):
+    try:
+        return int(float(valor))
+    except (TypeError, ValueError):
+        return 0
+
+INFO_VACIA = {
+    'duration': 0,
+    'width': 0,
+    'height': 0,
+    'video_codec': None,
+    'audio_codec': None,
+    'fps': 0,
+    'pix_fmt': None,
+    'bitrate': 0,
+    'audio_bitrate': 0
+}
+
+def _resumir(info):
+    """Reduce la salida de ffprobe a los atributos que usa el bot"""
+    formato = info.get('format', {})
+    streams = info.get('streams', [])
+    video = next((s for s in streams if s.get('codec_type') == 'video'), {})
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), {})
+    fps = _fraccion(video.get('avg_frame_rate')) or _fraccion(video.get('r_frame_rate'))
+    return {
+        'duration': _fraccion(video.get('duration')) or _fraccion(formato.get('duration')),
+        'width': _entero(video.get('width')),
+        'height': _entero(video.get('height')),
+        'video_codec': video.get('codec_name'),
+        'audio_codec': audio.get('codec_name'),
+        'fps': round(fps, 3),
+        'pix_fmt': video.get('pix_fmt'),
+        'bitrate': _entero(formato.get('bit_rate')) or _entero(video.get('bit_rate')),
+        'audio_bitrate': _entero(audio.get('bit_rate'))
+    }
+
+# Cache LRU de sondeos indexada por (ruta, tamano, mtime): si el archivo
+# cambia la clave tambien cambia y la entrada vieja acaba desalojada.
+# Los sondeos simultaneos del mismo archivo comparten un unico ffprobe.
+class CacheSondeos:
+    def __init__(self, maximo=SONDEO_CACHE):
+        self.maximo = maximo
+        self.entradas = OrderedDict()
+        self.en_curso = {}
+
+    def _clave(self, ruta):
+        estado = os.stat(ruta)
+        return (os.path.realpath(ruta), estado.st_size, estado.st_mtime_ns)
+
+    async def obtener(self, ruta):
+        clave = self._clave(ruta)
+        if clave in self.entradas:
+            self.entradas.move_to_end(clave)
+            return dict(self.entradas[clave])
+        if clave not in self.en_curso:
+            self.en_curso[clave] = asyncio.ensure_future(self._sondear(clave, ruta))
+        return dict(await asyncio.shield(self.en_curso[clave]))
+
+    async def _sondear(self, clave, ruta):
+        try:
+            info = await trabajadores.ffprobe(
+                ruta, "-v", "error",
+                "-show_entries",
+                "format=duration,bit_rate:"
+                "stream=codec_type,codec_name,width,height,avg_frame_rate,r_frame_rate,pix_fmt,duration,bit_rate"
+            )
+            resultado = _resumir(info)
+            self.entradas[clave] = resultado
+            while len(self.entradas) > self.maximo:
+                self.entradas.popitem(last=False)
+            return resultado
+        finally:
+            self.en_curso.pop(clave, None)
+
+sondeos = CacheSondeos()
+
+async def info_video(ruta):
+    """Atributos del video con un solo ffprobe: duracion, dimensiones,
+    codecs, fps, pix_fmt y bitrate"""
+    try:
+        return await sondeos.obtener(ruta)
+    except Exception as ex:
+        print(f"Error getting video info: {ex}")
+        return dict(INFO_VACIA)
+
+async def generar_miniatura(video_path, output_path, segundo=1, ancho=320):
+    """Extrae un fotograma escalado a `ancho` en el segundo indicado"""
+    try:
+        await trabajadores.ffmpeg([
+            "-ss", segundo, "-i", video_path,
+            "-vf", f"scale={ancho}:-1", "-vframes", "1",
+            "-y", output_path
+        ], pesado=False)
+        return os.path.exists(output_path)
+    except Exception as e:
+        print(f"Error generando miniatura: {e}")
+        return False
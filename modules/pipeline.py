@@ -0,0 +1,56 @@
+import asyncio
+
+async def _iterar(elementos):
+    if hasattr(elementos, "__aiter__"):
+        async for elemento in elementos:
+            yield elemento
+    else:
+        for elemento in elementos:
+            yield elemento
+
+# Pipeline productor/consumidor que conserva el orden.
+# preparar(elemento) se ejecuta de forma concurrente con hasta `en_vuelo`
+# elementos por delante del consumidor, mientras que consumir(elemento, tarea)
+# se llama estrictamente en el orden de entrada. El consumidor recibe la
+# tarea sin esperar para poder capturar las excepciones de preparar() en su
+# propio try/except. Los resultados que quedan sin consumir al abortar se
+# entregan a descartar() para poder borrar archivos temporales.
+async def pipeline_ordenado(elementos, preparar, consumir, en_vuelo=3, descartar=None):
+    huecos = asyncio.Semaphore(max(1, en_vuelo))
+    cola = asyncio.Queue()
+
+    async def productor():
+        try:
+            async for elemento in _iterar(elementos):
+                await huecos.acquire()
+                await cola.put((elemento, asyncio.ensure_future(preparar(elemento))))
+        finally:
+            await cola.put(None)
+
+    tarea_productor = asyncio.create_task(productor())
+    try:
+        while True:
+            item = await cola.get()
+            if item is None:
+                break
+            elemento, tarea = item
+            try:
+                await consumir(elemento, tarea)
+            finally:
+                huecos.release()
+        # Propaga errores del iterador de elementos
+        await tarea_productor
+    finally:
+        tarea_productor.cancel()
+        while not cola.empty():
+            item = cola.get_nowait()
+            if item is None:
+                continue
+            _, tarea = item
+            if not tarea.done():
+                tarea.cancel()
+            elif descartar and not tarea.cancelled() and tarea.exception() is None:
+                try:
+                    descartar(tarea.result())
+                except Exception as e:
+                    print(f"Error descartando elemento del pipeline: {e}")
@@ -0,0 +1,154 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import time
+from functools import wraps
+
+from modules.config import PLANIFICADOR_LIMITES, PLANIFICADOR_PRIORIDADES, PLANIFICADOR_TOTAL
+
+EN_COLA = "en cola"
+EJECUTANDO = "ejecutando"
+
+# Tarea del planificador que se esta ejecutando en el contexto actual
+tarea_actual = contextvars.ContextVar("tarea_actual", default=None)
+
+class Tarea:
+    def __init__(self, id, tipo, descripcion, prioridad):
+        self.id = id
+        self.tipo = tipo
+        self.descripcion = descripcion
+        self.prioridad = prioridad
+        self.estado = EN_COLA
+        self.creado = time.monotonic()
+        self.inicio = None
+        self.progreso = None
+        self.corrutina = None
+        self.tarea = None
+
+    @property
+    def espera(self):
+        return (self.inicio or time.monotonic()) - self.creado
+
+    @property
+    def duracion(self):
+        return time.monotonic() - self.inicio if self.inicio else 0
+
+def _limite(tipo, limites):
+    limite = limites.get(tipo)
+    if limite is None:
+        # Sin limite configurado: tareas de CPU, la mitad de los nucleos
+        return max(1, (os.cpu_count() or 1) // 2)
+    return max(1, limite)
+
+# Planificador global de comandos pesados.
+# Cada tipo de tarea tiene su limite de concurrencia (PLANIFICADOR_LIMITES)
+# y una prioridad (PLANIFICADOR_PRIORIDADES, menor = antes), y ademas no
+# corren mas de PLANIFICADOR_TOTAL tareas a la vez. Cada vez que queda un
+# hueco se lanza la tarea en cola de mayor prioridad cuyo tipo tenga sitio;
+# a igual prioridad, la mas antigua. Las tareas corren en su propio asyncio
+# Task, asi que el handler de Pyrogram vuelve enseguida y cancelar una
+# tarea no afecta a los workers del dispatcher.
+class Planificador:
+    def __init__(self, limites=PLANIFICADOR_LIMITES, prioridades=PLANIFICADOR_PRIORIDADES, total=PLANIFICADOR_TOTAL):
+        self.limites = limites
+        self.prioridades = prioridades
+        self.total = total
+        self.cola = []
+        self.corriendo = {}
+        self.tareas = {}
+        self._ids = itertools.count(1)
+        self._orden = itertools.count()
+
+    def _ocupados(self, tipo):
+        return sum(1 for t in self.corriendo.values() if t.tipo == tipo)
+
+    def encolar(self, tipo, descripcion, corrutina):
+        """Registra `corrutina` y la lanza cuando su tipo tenga hueco"""
+        tarea = Tarea(next(self._ids), tipo, descripcion, self.prioridades.get(tipo, 5))
+        tarea.corrutina = corrutina
+        self.tareas[tarea.id] = tarea
+        heapq.heappush(self.cola, (tarea.prioridad, next(self._orden), tarea.id))
+        self._despachar()
+        return tarea
+
+    def _despachar(self):
+        pendientes = []
+        while self.cola and len(self.corriendo) < self.total:
+            entrada = heapq.heappop(self.cola)
+            tarea = self.tareas.get(entrada[2])
+            if tarea is None:
+                continue
+            if self._ocupados(tarea.tipo) < _limite(tarea.tipo, self.limites):
+                self._lanzar(tarea)
+            else:
+                pendientes.append(entrada)
+        for entrada in pendientes:
+            heapq.heappush(self.cola, entrada)
+
+    def _lanzar(self, tarea):
+        tarea.estado = EJECUTANDO
+        tarea.inicio = time.monotonic()
+        self.corriendo[tarea.id] = tarea
+        contexto = contextvars.copy_context()
+        contexto.run(tarea_actual.set, tarea)
+        tarea.tarea = asyncio.get_running_loop().create_task(self._correr(tarea), context=contexto)
+
+    async def _correr(self, tarea):
+        try:
+            await tarea.corrutina
+        except asyncio.CancelledError:
+            print(f"Tarea #{tarea.id} ({tarea.tipo}) cancelada")
+        except Exception as ex:
+            print(f"Error en la tarea #{tarea.id} ({tarea.tipo}): {ex}")
+        finally:
+            self.corriendo.pop(tarea.id, None)
+            self.tareas.pop(tarea.id, None)
+            self._despachar()
+
+    def cancelar(self, tarea_id):
+        """Cancela una tarea en cola o en ejecucion. Devuelve la tarea o None"""
+        tarea = self.tareas.get(tarea_id)
+        if tarea is None:
+            return None
+        if tarea.estado == EN_COLA:
+            self.tareas.pop(tarea_id, None)
+            tarea.corrutina.close()
+        else:
+            tarea.tarea.cancel()
+        return tarea
+
+    def posicion(self, tarea):
+        """Puesto de una tarea en cola dentro de su tipo (1 = la siguiente)"""
+        delante = [e for e in self.cola if e[2] in self.tareas and self.tareas[e[2]].tipo == tarea.tipo]
+        return sorted(delante).index(next(e for e in delante if e[2] == tarea.id)) + 1
+
+    def listar(self):
+        corriendo = sorted(self.corriendo.values(), key=lambda t: t.id)
+        en_cola = [self.tareas[e[2]] for e in sorted(self.cola) if e[2] in self.tareas]
+        return corriendo, en_cola
+
+planificador = Planificador()
+
+def informar(progreso):
+    """Actualiza el progreso visible en -queue de la tarea actual (si la hay)"""
+    tarea = tarea_actual.get()
+    if tarea is not None:
+        tarea.progreso = progreso
+
+def planificado(tipo):
+    """Decorador de handlers: el comando pasa por el planificador en lugar
+    de ejecutarse en el momento"""
+    def decorador(func):
+        @wraps(func)
+        async def wrapper(client, message):
+            descripcion = (message.text or message.caption or func.__name__).split("\n")[0][:60]
+            tarea = planificador.encolar(tipo, descripcion, func(client, message))
+            if tarea.estado == EN_COLA:
+                await message.reply(
+                    f"**[77]** En cola como tarea `#{tarea.id}` "
+                    f"(puesto {planificador.posicion(tarea)} de tipo {tipo}). `-cancel {tarea.id}` para cancelarla."
+                )
+        return wrapper
+    return decorador
@@ -0,0 +1,71 @@
+import asyncio
+from collections import deque
+
+from modules.config import PREFETCH_LOTE, PREFETCH_VENTANA
+from modules.limitador import limitador
+
+# Maximo de ids que acepta get_messages en una sola llamada
+MAX_LOTE = 200
+
+def es_util(msg):
+    """Indica si un mensaje tiene contenido que se pueda reenviar"""
+    return bool(msg) and not msg.empty and not msg.service
+
+# Recorre un rango de mensajes pidiendo los metadatos por lotes.
+# Mantiene `ventana` lotes pedidos por delante del consumidor y
+# descarta los mensajes vacios o de servicio sin hacer RPCs por id.
+class PrefetchMensajes:
+    def __init__(self, client, chat_id, inicio, cantidad, lote=PREFETCH_LOTE, ventana=PREFETCH_VENTANA):
+        self.client = client
+        self.chat_id = chat_id
+        self.inicio = inicio
+        self.fin = inicio + cantidad
+        self.lote = max(1, min(lote, MAX_LOTE))
+        self.ventana = max(1, ventana)
+        self.omitidos = 0
+        self.ultimo_id = inicio - 1
+
+    async def _pedir(self, ids):
+        mensajes = await limitador.ejecutar("get", self.client.get_messages, self.chat_id, ids)
+        if not isinstance(mensajes, list):
+            mensajes = [mensajes]
+        return mensajes
+
+    def __aiter__(self):
+        return self._iterar()
+
+    async def _iterar(self):
+        rangos = deque(
+            list(range(desde, min(desde + self.lote, self.fin)))
+            for desde in range(self.inicio, self.fin, self.lote)
+        )
+        pendientes = deque()
+        try:
+            while rangos or pendientes:
+                while rangos and len(pendientes) < self.ventana:
+                    ids = rangos.popleft()
+                    pendientes.append((ids, asyncio.ensure_future(self._pedir(ids))))
+                ids, tarea = pendientes.popleft()
+                for msg in await tarea:
+                    if es_util(msg):
+                        yield msg
+                    else:
+                        self.omitidos += 1
+                self.ultimo_id = ids[-1]
+        finally:
+            for _, tarea in pendientes:
+                tarea.cancel()
+
+async def agrupar_albumes(mensajes):
+    """Agrupa los mensajes consecutivos de un mismo album (media_group_id) en listas"""
+    grupo = []
+    async for msg in mensajes:
+        if grupo and (not msg.media_group_id or msg.media_group_id != grupo[0].media_group_id):
+            yield grupo
+            grupo = []
+        grupo.append(msg)
+        if not msg.media_group_id:
+            yield grupo
+            grupo = []
+    if grupo:
+        yield grupo
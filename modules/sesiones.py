@@ -0,0 +1,142 @@
+import time
+
+from pyrogram import Client
+from pyrogram.errors import ChannelInvalid, ChannelPrivate, PeerIdInvalid
+
+from modules.config import NAME, API_ID, API_HASH, VERSION, ENGINE, SESIONES_EXTRA
+from modules.limitador import Limitador, limitador
+from modules.descargas import descargador
+
+# Fallos seguidos tras los que una sesion se aparta del reparto
+FALLOS_MAX = 3
+PAUSA_FALLOS = 60  # segundos por cada fallo acumulado
+
+# Cuenta usada para transferencias, con su propio limitador (y por tanto
+# su propio presupuesto de FloodWait) y un estado de salud sencillo.
+class Sesion:
+    def __init__(self, nombre, client, limitador):
+        self.nombre = nombre
+        self.client = client
+        self.limitador = limitador
+        self.activas = 0
+        self.fallos = 0
+        self.transferencias = 0
+        self.pausada_hasta = 0
+        # Chats que esta cuenta no puede leer (no es miembro)
+        self.sin_acceso = set()
+
+    def disponible(self, chat_id=None):
+        ahora = time.monotonic()
+        if ahora < self.pausada_hasta or chat_id in self.sin_acceso:
+            return False
+        # Mientras Telegram la tenga bloqueada por flood se deja descansar
+        return all(ahora >= c.bloqueado_hasta for c in self.limitador.cubetas.values())
+
+    def exito(self):
+        self.fallos = 0
+        self.transferencias += 1
+
+    def fallo(self):
+        self.fallos += 1
+        if self.fallos >= FALLOS_MAX:
+            self.pausada_hasta = time.monotonic() + PAUSA_FALLOS * self.fallos
+
+# Reparte las descargas entre la cuenta principal y las sesiones extra de
+# SESIONES_EXTRA. Los comandos siguen llegando solo por la principal; las
+# extra se conectan sin recibir updates y solo descargan. Como los file_id
+# dependen de la cuenta, cada sesion extra vuelve a pedir el mensaje antes
+# de descargarlo y, si no puede verlo, la descarga pasa a la principal.
+class PoolSesiones:
+    def __init__(self, cadenas=SESIONES_EXTRA):
+        self.cadenas = list(cadenas)
+        self.principal = None
+        self.sesiones = []
+
+    async def iniciar(self, client):
+        self.principal = Sesion("principal", client, limitador)
+        self.sesiones = [self.principal]
+        for numero, cadena in enumerate(self.cadenas, 1):
+            extra = Client(
+                f"{NAME}_extra{numero}",
+                api_id=API_ID,
+                api_hash=API_HASH,
+                session_string=cadena,
+                in_memory=True,
+                no_updates=True,
+                app_version=VERSION,
+                device_model=ENGINE
+            )
+            try:
+                await extra.start()
+            except Exception as ex:
+                print(f"No se pudo iniciar la sesion extra {numero}: {ex}")
+                continue
+            self.sesiones.append(Sesion(f"extra{numero}", extra, Limitador()))
+        if len(self.sesiones) > 1:
+            print(f"Pool de sesiones: {len(self.sesiones)} cuentas para transferencias")
+
+    async def detener(self):
+        for sesion in self.sesiones[1:]:
+            try:
+                await sesion.client.stop()
+            except Exception as ex:
+                print(f"Error deteniendo la sesion {sesion.nombre}: {ex}")
+        self.sesiones = self.sesiones[:1]
+
+    def elegir(self, chat_id=None):
+        """Sesion sana con menos transferencias en curso"""
+        candidatas = [s for s in self.sesiones if s.disponible(chat_id)]
+        if not candidatas:
+            return self.principal
+        return min(candidatas, key=lambda s: (s.activas, s.fallos))
+
+    async def _descargar_extra(self, sesion, msg, **kwargs):
+        # Solo se aparta el chat si la cuenta no puede verlo; cualquier otro
+        # error (FloodWait agotado, timeout, red) cuenta como fallo de la sesion
+        try:
+            propio = await sesion.limitador.ejecutar("get", sesion.client.get_messages, msg.chat.id, msg.id)
+        except (ChannelPrivate, ChannelInvalid, PeerIdInvalid):
+            propio = None
+        if not propio or propio.empty or not propio.media:
+            sesion.sin_acceso.add(msg.chat.id)
+            return None
+        return await descargador.descargar(sesion.client, propio, **kwargs)
+
+    async def descargar(self, msg, **kwargs):
+        """Descarga repartida entre las sesiones del pool (por partes si es grande)"""
+        sesion = self.elegir(msg.chat.id)
+        if sesion is not self.principal:
+            sesion.activas += 1
+            try:
+                ruta = await self._descargar_extra(sesion, msg, **kwargs)
+                if ruta:
+                    sesion.exito()
+                    return ruta
+            except Exception as ex:
+                print(f"Descarga fallida en la sesion {sesion.nombre}, se usa la principal: {ex}")
+                sesion.fallo()
+            finally:
+                sesion.activas -= 1
+            sesion = self.principal
+
+        sesion.activas += 1
+        try:
+            ruta = await descargador.descargar(sesion.client, msg, **kwargs)
+            sesion.exito()
+            return ruta
+        finally:
+            sesion.activas -= 1
+
+    def estado(self):
+        return [
+            {
+                "nombre": s.nombre,
+                "activas": s.activas,
+                "transferencias": s.transferencias,
+                "fallos": s.fallos,
+                "disponible": s.disponible()
+            }
+            for s in self.sesiones
+        ]
+
+sesiones = PoolSesiones()
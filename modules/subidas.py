@@ -0,0 +1,144 @@
+import asyncio
+import contextvars
+import inspect
+import mmap
+import os
+import time
+
+from pyrogram import Client, raw
+from pyrogram.errors import FloodWait
+from pyrogram.session import Session
+
+from modules.config import SUBIDA_CONEXIONES, SUBIDA_PARTES_EN_VUELO, SUBIDA_PARALELA_MIN, SUBIDA_REINTENTOS
+from modules.telemetria import dc_actual
+
+# Tamano de parte maximo para upload.SaveBigFilePart
+PARTE = 512 * 1024
+# Por debajo de este tamano Telegram exige SaveFilePart con md5
+MINIMO_GRANDE = 10 * 1024 * 1024 + 1
+
+# Archivos ya subidos durante la llamada en curso del limitador (ruta ->
+# InputFile). Si el envio final falla con FloodWait y se reintenta, el
+# archivo no se vuelve a subir: solo se repite la peticion de envio.
+subidos = contextvars.ContextVar("subidos", default=None)
+
+# Subidor por partes. Lee el archivo a traves de un mmap y mantiene
+# SUBIDA_PARTES_EN_VUELO partes de 512 KB en vuelo repartidas entre
+# SUBIDA_CONEXIONES sesiones de media del DC propio. Cada parte se reintenta
+# por separado, esperando lo que pida Telegram si hay FloodWait.
+class SubidorParalelo:
+    def __init__(self, conexiones=SUBIDA_CONEXIONES, en_vuelo=SUBIDA_PARTES_EN_VUELO, minimo=SUBIDA_PARALELA_MIN, intentos=SUBIDA_REINTENTOS):
+        self.conexiones = max(1, conexiones)
+        self.en_vuelo = max(1, en_vuelo)
+        self.minimo = max(minimo, MINIMO_GRANDE)
+        self.intentos = max(1, intentos)
+        self.sesiones = {}
+        self._locks = {}
+        # Totales para calcular la velocidad media de todas las subidas
+        self.bytes_subidos = 0
+        self.segundos = 0.0
+
+    async def _sesiones(self, client):
+        clave = id(client)
+        lock = self._locks.setdefault(clave, asyncio.Lock())
+        async with lock:
+            if clave not in self.sesiones:
+                dc_id = await client.storage.dc_id()
+                auth_key = await client.storage.auth_key()
+                test_mode = await client.storage.test_mode()
+                sesiones = []
+                for _ in range(self.conexiones):
+                    sesion = Session(client, dc_id, auth_key, test_mode, is_media=True)
+                    await sesion.start()
+                    sesiones.append(sesion)
+                self.sesiones[clave] = sesiones
+        return self.sesiones[clave]
+
+    async def _parte(self, sesion, peticion):
+        for intento in range(self.intentos):
+            try:
+                if await sesion.invoke(peticion):
+                    return
+                raise ConnectionError("Telegram rechazo la parte")
+            except FloodWait as e:
+                await asyncio.sleep(e.value)
+            except Exception as ex:
+                if intento == self.intentos - 1:
+                    raise
+                print(f"Reintentando parte {peticion.file_part}: {ex}")
+                await asyncio.sleep(2 ** intento)
+        raise ConnectionError(f"No se pudo subir la parte {peticion.file_part}")
+
+    def velocidad(self):
+        """MB/s medios de todas las subidas por partes"""
+        return self.bytes_subidos / 1024 / 1024 / self.segundos if self.segundos else 0.0
+
+    async def subir(self, client, ruta, progress=None, progress_args=()):
+        tamano = os.path.getsize(ruta)
+        total_partes = (tamano + PARTE - 1) // PARTE
+        file_id = client.rnd_id()
+        sesiones = await self._sesiones(client)
+        token = dc_actual.set(await client.storage.dc_id())
+        partes = asyncio.Queue()
+        for numero in range(total_partes):
+            partes.put_nowait(numero)
+        subido = 0
+        inicio = time.monotonic()
+
+        with open(ruta, "rb") as archivo, mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ) as vista:
+            async def trabajador(numero):
+                nonlocal subido
+                sesion = sesiones[numero % len(sesiones)]
+                while not partes.empty():
+                    parte = partes.get_nowait()
+                    datos = await asyncio.to_thread(vista.__getitem__, slice(parte * PARTE, (parte + 1) * PARTE))
+                    await self._parte(sesion, raw.functions.upload.SaveBigFilePart(
+                        file_id=file_id,
+                        file_part=parte,
+                        file_total_parts=total_partes,
+                        bytes=datos
+                    ))
+                    subido += len(datos)
+                    if progress:
+                        resultado = progress(subido, tamano, *progress_args)
+                        if inspect.isawaitable(resultado):
+                            await resultado
+
+            trabajadores = [asyncio.ensure_future(trabajador(n)) for n in range(self.en_vuelo)]
+            dc_actual.reset(token)
+            try:
+                await asyncio.gather(*trabajadores)
+            except BaseException:
+                for tarea in trabajadores:
+                    tarea.cancel()
+                await asyncio.gather(*trabajadores, return_exceptions=True)
+                raise
+
+        segundos = time.monotonic() - inicio
+        self.bytes_subidos += tamano
+        self.segundos += segundos
+        mb = tamano / 1024 / 1024
+        print(f"Subida de {os.path.basename(ruta)}: {mb:.1f} MB en {segundos:.1f}s "
+              f"({mb / segundos if segundos else 0:.2f} MB/s, media {self.velocidad():.2f} MB/s)")
+        return raw.types.InputFileBig(id=file_id, parts=total_partes, name=os.path.basename(ruta))
+
+subidor = SubidorParalelo()
+
+# Cliente que sube los archivos grandes con el subidor por partes; todo lo
+# demas (archivos pequenos, objetos en memoria, reanudaciones) sigue por
+# el save_file de Pyrogram. Dentro de limitador.ejecutar cada ruta se sube
+# una sola vez aunque el envio se reintente.
+class ClienteBot(Client):
+    async def save_file(self, path, *args, **kwargs):
+        es_ruta = isinstance(path, (str, os.PathLike)) and not args and not kwargs.get("file_id")
+        previos = subidos.get() if es_ruta else None
+        clave = os.path.abspath(path) if previos is not None else None
+        if clave in (previos or {}):
+            return previos[clave]
+        if es_ruta and os.path.isfile(path) and os.path.getsize(path) >= subidor.minimo:
+            resultado = await subidor.subir(self, path, kwargs.get("progress"), kwargs.get("progress_args", ()))
+        else:
+            resultado = await super().save_file(path, *args, **kwargs)
+        if clave is not None and resultado is not None:
+            previos[clave] = resultado
+        return resultado
@@ -0,0 +1,144 @@
+import contextvars
+import time
+from collections import deque
+
+from modules.config import PROGRESO_INTERVALO, TELEMETRIA_HISTORIAL
+
+# DC por el que viaja la transferencia en curso. Lo fijan los transferidores
+# que lo conocen (descargas y subidas por partes) antes de lanzar sus tareas.
+dc_actual = contextvars.ContextVar("dc_actual", default=None)
+
+# Sin noticias de una transferencia en este tiempo se da por interrumpida
+INACTIVIDAD = 120
+
+MB = 1024 * 1024
+
+def _mb(valor):
+    return f"{valor / MB:.1f} MB"
+
+def _duracion(segundos):
+    segundos = int(segundos)
+    return f"{segundos // 3600}:{segundos % 3600 // 60:02d}:{segundos % 60:02d}"
+
+class Transferencia:
+    def __init__(self, accion, total, dc=None):
+        self.accion = accion
+        self.total = total
+        self.dc = dc
+        self.actual = 0
+        self.inicio = time.monotonic()
+        self.fin = None
+        self.estado = "en curso"
+        self.velocidad = 0.0  # bytes/s instantanea (media movil)
+        self._muestra = (self.inicio, 0)
+        self._ultima_edicion = 0
+        self.edicion = None
+
+    def actualizar(self, actual, total):
+        ahora = time.monotonic()
+        self.actual = actual
+        self.total = total or self.total
+        instante, bytes_previos = self._muestra
+        # Se muestrea cada medio segundo para que la velocidad no oscile
+        if ahora - instante >= 0.5:
+            instantanea = (actual - bytes_previos) / (ahora - instante)
+            self.velocidad = instantanea if not self.velocidad else 0.3 * instantanea + 0.7 * self.velocidad
+            self._muestra = (ahora, actual)
+        if self.total and actual >= self.total:
+            self.terminar()
+
+    def terminar(self, estado="completada"):
+        if self.fin is None:
+            self.fin = time.monotonic()
+            self.estado = estado
+
+    @property
+    def duracion(self):
+        return (self.fin or time.monotonic()) - self.inicio
+
+    @property
+    def media(self):
+        """bytes/s medios desde el inicio"""
+        return self.actual / self.duracion if self.duracion > 0 else 0.0
+
+    @property
+    def eta(self):
+        velocidad = self.velocidad or self.media
+        if not velocidad or not self.total:
+            return None
+        return max(0, self.total - self.actual) / velocidad
+
+    def toca_editar(self, intervalo=PROGRESO_INTERVALO):
+        ahora = time.monotonic()
+        if self.fin is None and ahora - self._ultima_edicion < intervalo:
+            return False
+        if self.edicion and not self.edicion.done():
+            return False
+        self._ultima_edicion = ahora
+        return True
+
+    def texto(self):
+        porcentaje = self.actual * 100 / self.total if self.total else 0
+        eta = self.eta
+        return (
+            f"{_mb(self.actual)} / {_mb(self.total)} ({porcentaje:.1f}%)\n"
+            f"{self.velocidad / MB:.2f} MB/s (media {self.media / MB:.2f} MB/s)"
+            + (f" - ETA {_duracion(eta)}" if eta is not None and self.fin is None else "")
+        )
+
+# Registro de transferencias en memoria: las activas por clave y las
+# ultimas TELEMETRIA_HISTORIAL terminadas en un buffer circular.
+class Telemetria:
+    def __init__(self, historial=TELEMETRIA_HISTORIAL):
+        self.activas = {}
+        self.historial = deque(maxlen=historial)
+
+    def actualizar(self, clave, accion, actual, total):
+        transferencia = self.activas.get(clave)
+        if transferencia is None:
+            transferencia = self.activas[clave] = Transferencia(accion, total, dc_actual.get())
+        transferencia.actualizar(actual, total)
+        if transferencia.fin is not None:
+            self.historial.append(self.activas.pop(clave))
+        return transferencia
+
+    def _purgar(self):
+        ahora = time.monotonic()
+        for clave, transferencia in list(self.activas.items()):
+            if ahora - transferencia._muestra[0] > INACTIVIDAD:
+                transferencia.terminar("interrumpida")
+                self.historial.append(self.activas.pop(clave))
+
+    def resumen(self):
+        """Texto para -transfers con las activas, el historial y las medias por DC"""
+        self._purgar()
+        lineas = [f"**Activas ({len(self.activas)}):**"]
+        for transferencia in self.activas.values():
+            lineas.append(f"• {transferencia.accion}: {transferencia.texto().replace(chr(10), ' | ')}")
+
+        completadas = [t for t in self.historial if t.estado == "completada"]
+        total = sum(t.actual for t in completadas)
+        segundos = sum(t.duracion for t in completadas)
+        lineas.append(
+            f"\n**Ultimas {len(self.historial)}:** {len(completadas)} completadas, "
+            f"{len(self.historial) - len(completadas)} interrumpidas, {_mb(total)}"
+            + (f", media {total / segundos / MB:.2f} MB/s" if segundos else "")
+        )
+        for transferencia in list(self.historial)[-5:]:
+            lineas.append(
+                f"• {transferencia.accion}: {_mb(transferencia.actual)} en {_duracion(transferencia.duracion)} "
+                f"({transferencia.media / MB:.2f} MB/s, {transferencia.estado})"
+            )
+
+        por_dc = {}
+        for transferencia in completadas:
+            if transferencia.dc is not None:
+                bytes_dc, segundos_dc = por_dc.get(transferencia.dc, (0, 0.0))
+                por_dc[transferencia.dc] = (bytes_dc + transferencia.actual, segundos_dc + transferencia.duracion)
+        if por_dc:
+            lineas.append("\n**Por DC:**")
+            for dc, (bytes_dc, segundos_dc) in sorted(por_dc.items()):
+                lineas.append(f"• DC{dc}: {_mb(bytes_dc)}, {bytes_dc / segundos_dc / MB if segundos_dc else 0:.2f} MB/s")
+        return "\n".join(lineas)
+
+telemetria = Telemetria()
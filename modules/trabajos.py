@@ -0,0 +1,129 @@
+import json
+import time
+
+from modules.config import TRABAJOS_COMMIT_CADA, TRABAJOS_COMMIT_SEGUNDOS
+from modules.db import DB_PATH, conectar
+from modules.planificador import informar
+
+# Estados de un trabajo en el diario
+ACTIVO = "activo"
+COMPLETADO = "completado"
+FALLIDO = "fallido"
+CANCELADO = "cancelado"
+
+# Trabajo en curso. Los avances se acumulan en memoria y se escriben en
+# el diario cada TRABAJOS_COMMIT_CADA mensajes o TRABAJOS_COMMIT_SEGUNDOS
+# segundos, lo que ocurra antes.
+class Trabajo:
+    def __init__(self, diario, fila):
+        self.diario = diario
+        self.id = fila["id"]
+        self.tipo = fila["tipo"]
+        self.params = json.loads(fila["params"])
+        self.ultimo_id = fila["ultimo_id"]
+        self.exitos = fila["exitos"]
+        self.errores = fila["errores"]
+        self.estado = fila["estado"]
+        self._pendientes = 0
+        self._ultimo_guardado = time.monotonic()
+
+    def avanzar(self, message_id, exito=True):
+        self.avanzar_lote(
+            message_id,
+            exitos=1 if exito is True else 0,
+            errores=1 if exito is False else 0,
+            procesados=1
+        )
+
+    def avanzar_lote(self, ultimo_id, exitos=0, errores=0, procesados=None):
+        """Registra de una vez el resultado de un lote de mensajes hasta `ultimo_id`"""
+        if ultimo_id is not None:
+            self.ultimo_id = max(self.ultimo_id or 0, ultimo_id)
+        self.exitos += exitos
+        self.errores += errores
+        self._pendientes += exitos + errores if procesados is None else procesados
+        informar(f"{self.exitos} ok, {self.errores} errores, ultimo id {self.ultimo_id}")
+        if (self._pendientes >= TRABAJOS_COMMIT_CADA
+                or time.monotonic() - self._ultimo_guardado >= TRABAJOS_COMMIT_SEGUNDOS):
+            self.guardar()
+
+    def guardar(self):
+        self.diario.actualizar(self)
+        self._pendientes = 0
+        self._ultimo_guardado = time.monotonic()
+
+    def terminar(self, estado=COMPLETADO):
+        self.estado = estado
+        self.guardar()
+        self.diario.en_curso.discard(self.id)
+
+# Diario de trabajos de transferencia (-save / -urlsave) en SQLite
+class Diario:
+    def __init__(self, ruta=DB_PATH):
+        self.ruta = ruta
+        self._conn = None
+        # Trabajos que se estan ejecutando en este proceso
+        self.en_curso = set()
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = conectar(self.ruta)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS trabajos (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    tipo TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    ultimo_id INTEGER,
+                    exitos INTEGER NOT NULL DEFAULT 0,
+                    errores INTEGER NOT NULL DEFAULT 0,
+                    estado TEXT NOT NULL,
+                    creado REAL NOT NULL,
+                    actualizado REAL NOT NULL
+                )
+            """)
+            self._conn.commit()
+        return self._conn
+
+    def crear(self, tipo, params):
+        ahora = time.time()
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO trabajos (tipo, params, ultimo_id, estado, creado, actualizado) "
+                "VALUES (?, ?, NULL, ?, ?, ?)",
+                (tipo, json.dumps(params), ACTIVO, ahora, ahora)
+            )
+        trabajo = self.obtener(cursor.lastrowid)
+        self.en_curso.add(trabajo.id)
+        return trabajo
+
+    def obtener(self, trabajo_id):
+        fila = self.conn.execute("SELECT * FROM trabajos WHERE id = ?", (trabajo_id,)).fetchone()
+        return Trabajo(self, fila) if fila else None
+
+    def reanudar(self, trabajo_id):
+        """Marca un trabajo como activo en este proceso (None si ya se esta ejecutando)"""
+        trabajo = self.obtener(trabajo_id)
+        if not trabajo or trabajo.id in self.en_curso:
+            return None
+        trabajo.estado = ACTIVO
+        trabajo.guardar()
+        self.en_curso.add(trabajo.id)
+        return trabajo
+
+    def actualizar(self, trabajo):
+        with self.conn:
+            self.conn.execute(
+                "UPDATE trabajos SET ultimo_id = ?, exitos = ?, errores = ?, estado = ?, actualizado = ? WHERE id = ?",
+                (trabajo.ultimo_id, trabajo.exitos, trabajo.errores, trabajo.estado, time.time(), trabajo.id)
+            )
+
+    def pendientes(self):
+        filas = self.conn.execute("SELECT id FROM trabajos WHERE estado = ? ORDER BY id", (ACTIVO,)).fetchall()
+        return [fila["id"] for fila in filas if fila["id"] not in self.en_curso]
+
+    def listar(self, limite=10):
+        filas = self.conn.execute("SELECT * FROM trabajos ORDER BY id DESC LIMIT ?", (limite,)).fetchall()
+        return [Trabajo(self, fila) for fila in filas]
+
+diario = Diario()